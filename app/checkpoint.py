@@ -0,0 +1,86 @@
+import json
+import os
+import typing as t
+from pathlib import Path
+
+from app.logging import logger
+
+
+class Checkpoint:
+    """
+    Durable set of acknowledged document id ranges, [start, stop)
+    of the index `index_uuid`, the ranges of another index (deleted and
+    created again under the same name) are discarded
+    """
+    def __init__(self, path: Path, index_uuid: t.Optional[str] = None) -> None:
+        self.path = path
+        self.index_uuid = index_uuid
+        self.ranges: list[list[int]] = []
+
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                data: dict = json.load(f)
+
+            if index_uuid is not None and data.get('index_uuid') != index_uuid:
+                logger.warning(
+                    f'checkpoint {self.path} belongs to another index '
+                    f'(uuid {data.get("index_uuid")}, current {index_uuid}), reset'
+                )
+            else:
+                self.ranges = data['ranges']
+
+    @property
+    def high_watermark(self) -> int:
+        """
+        First id after the last acknowledged range
+        """
+        return self.ranges[-1][1] if self.ranges else 0
+
+    @property
+    def acknowledged(self) -> int:
+        return sum(stop - start for start, stop in self.ranges)
+
+    def add(self, start: int, stop: int) -> None:
+        ranges: list[list[int]] = []
+
+        for item in sorted(self.ranges + [[start, stop]]):
+            if ranges and item[0] <= ranges[-1][1]:
+                ranges[-1][1] = max(ranges[-1][1], item[1])
+            else:
+                ranges.append(item)
+
+        self.ranges = ranges
+        self._save()
+
+    def rebind(self, index_uuid: str) -> None:
+        """
+        The same documents moved to another index (see rebuild_index)
+        """
+        self.index_uuid = index_uuid
+        self._save()
+
+    def missing(self, start: int, stop: int) -> t.Iterator[tuple[int, int]]:
+        """
+        Not acknowledged sub-ranges of [start, stop)
+        """
+        for range_start, range_stop in self.ranges:
+            if range_stop <= start:
+                continue
+            if range_start >= stop:
+                break
+            if range_start > start:
+                yield start, range_start
+            start = max(start, range_stop)
+
+        if start < stop:
+            yield start, stop
+
+    def _save(self) -> None:
+        tmp_path = f'{self.path}.tmp'
+
+        with open(tmp_path, 'w') as f:
+            json.dump({'index_uuid': self.index_uuid, 'ranges': self.ranges}, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_path, self.path)
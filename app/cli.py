@@ -1,28 +1,161 @@
+import json
+import multiprocessing
 import os.path
+import typing as t
 from collections import Counter
+from concurrent.futures import as_completed, ProcessPoolExecutor
+from copy import deepcopy
+from datetime import datetime
 from pathlib import Path
-from random import choice, randint
-from time import time, time_ns
+from queue import Empty
+from random import choice, randint, random
+from time import monotonic, sleep, time, time_ns
 
 import click
 import yaml
 from elasticsearch import Elasticsearch
+from elasticsearch.helpers import BulkIndexError
 
 import app.config as c
+from app.checkpoint import Checkpoint
+from app.elasticsearch.probe import SearchProbe
+from app.elasticsearch.profiler import SearchProfiler
+from app.elasticsearch.sampler import ClusterStatsSampler
 from app.elasticsearch.session import ElasticsearchClient
 from app.elasticsearch.utils import (
     bulk,
     CHUNK_SIZE,
     create_index,
+    enrich_document,
+    export_slice,
     generate_random_document,
-    generate_random_search_query
+    generate_random_search_query,
+    generate_random_update,
+    generate_search_query_by_hits,
+    get_bulk_payload_size,
+    get_pipeline_config,
+    get_query_shape,
+    seed_generators,
+    set_workload,
+    throttled_bulk,
+    UPDATE_MODES
 )
-from app.logging import logger
+from app.elasticsearch.workers import get_slow_query_record, search_worker
+from app.logging import logger, PROGRESS
+from app.stats import get_hits_bucket, LatencyStats, write_run_report
+from app.throttle import throttle_options, TokenBucket
+
+if t.TYPE_CHECKING:
+    from app.shadow import ShadowIndex
 
 
 @click.group()
-def cli() -> None:
-    pass
+@click.option(
+    '--workload',
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    default=c.WORKLOAD_PROFILE,
+    help='YAML workload profile, see workloads/default.yml'
+)
+def cli(workload: Path) -> None:
+    if workload != c.WORKLOAD_PROFILE:
+        set_workload(workload)
+
+
+def _get_throttle(
+    name: str,
+    report_file: t.TextIO,
+    rate: float,
+    burst: t.Optional[float],
+    rate_profile: str,
+    ramp_duration: float,
+    diurnal_period: float
+) -> TokenBucket:
+    logger.info(
+        f'{name} rate: {rate or "unlimited"}, profile: {rate_profile}, '
+        f'report: {report_file.name}'
+    )
+
+    return TokenBucket(
+        rate,
+        burst,
+        rate_profile,
+        ramp_duration=ramp_duration,
+        diurnal_period=diurnal_period,
+        report_file=report_file
+    )
+
+
+def _get_checkpoint_path(index: str) -> Path:
+    return c.ES_CHECKPOINT_DIR / f'checkpoint_{index}.json'
+
+
+def _get_index_uuid(es_client: Elasticsearch, index: str) -> str:
+    settings: dict = es_client.indices.get_settings(index=index, name='index.uuid')
+    # an alias (see rebuild_index) resolves to the current concrete index
+    return next(iter(settings.values()))['settings']['index']['uuid']
+
+
+def _get_checkpoint(
+    es_client: Elasticsearch,
+    index: str,
+    path: t.Optional[Path] = None
+) -> Checkpoint:
+    return Checkpoint(
+        path or _get_checkpoint_path(index),
+        _get_index_uuid(es_client, index)
+    )
+
+
+def _check_pipeline(es_client: Elasticsearch, pipeline: str) -> None:
+    # 404 - no pipelines at all (a fresh cluster)
+    if pipeline not in es_client.ingest.get_pipeline(id=pipeline, ignore=404):
+        raise RuntimeError(
+            f'Ingest pipeline "{pipeline}" does not exist, '
+            f'run create_ingest_pipeline first'
+        ) from None
+
+
+def _get_max_document_id(es_client: Elasticsearch, index: str) -> int:
+    response: dict = es_client.search(
+        index=index,
+        size=0,
+        aggs={'max_id': {'max': {'field': 'clothing_item_id'}}}
+    )
+
+    return int(response['aggregations']['max_id']['value'] or 0)
+
+
+def _get_run_report_path(name: str) -> Path:
+    return c.ES_RUN_REPORT_DIR / f'run_{name}_{datetime.now():%Y%m%d_%H%M%S}.ndjson'
+
+
+def _get_rate_report_path(name: str) -> Path:
+    return c.ES_RATE_REPORT_DIR / f'{name}_{datetime.now():%Y%m%d_%H%M%S}.csv'
+
+
+def _get_shadow_index(
+    index: str,
+    size: int,
+    source: t.Optional[Path]
+) -> 'ShadowIndex':
+    # numpy is only needed by start_random_search --max_hits
+    from app.shadow import ShadowIndex
+
+    with ElasticsearchClient() as es_client:
+        total = es_client.count(index=index)['count']
+
+    start_time = time()
+    if source:
+        shadow = ShadowIndex.from_export(source, size=size, total=total)
+    else:
+        shadow = ShadowIndex.from_generator(size, total=total)
+
+    logger.info(
+        f'shadow index: {shadow.size} documents ({source or "generator"}), '
+        f'scale: {shadow.scale:.2f}, {time() - start_time:.2f} s'
+    )
+
+    return shadow
 
 
 @cli.command('update_configs')
@@ -167,27 +300,419 @@ def create_es_index(index: str) -> None:
     type=int,
     default=c.ES_CATALOG_DOCUMENTS_COUNT
 )
-def insert_test_data(index: str, documents_count: int) -> None:
-    with ElasticsearchClient(es_node_type='ingest') as es_client:
+@click.option('--start_id', type=int, default=1)
+@click.option(
+    '--checkpoint',
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=None,
+    help='acknowledged id ranges, default - logs/checkpoint_<index>.json'
+)
+@click.option(
+    '--pipeline',
+    type=str,
+    default=None,
+    help=(
+        'ingest pipeline (see create_ingest_pipeline), slim documents '
+        'are enriched server side'
+    )
+)
+@throttle_options
+def insert_test_data(
+    index: str,
+    documents_count: int,
+    start_id: int,
+    checkpoint: t.Optional[Path],
+    pipeline: t.Optional[str],
+    **throttle_kwargs: t.Any
+) -> None:
+    start = start_id
+    stop = start + documents_count
+    kwargs = {'pipeline': pipeline} if pipeline else {}
+
+    with ElasticsearchClient(es_node_type='ingest') as es_client, \
+            open(_get_rate_report_path('insert_test_data'), 'w') as report:
+        if pipeline:
+            _check_pipeline(es_client, pipeline)
+
+        checkpoint = _get_checkpoint(es_client, index, checkpoint)
+        if checkpoint.acknowledged:
+            logger.info(
+                f'checkpoint {checkpoint.path}: '
+                f'{checkpoint.acknowledged} ids acknowledged'
+            )
+
+        throttle = _get_throttle('insert_test_data', report, **throttle_kwargs)
         documents: list[dict] = list()
-        start = es_client.count(index=index)['count'] + 1
-        stop = start + documents_count
         total_inserted = 0
 
-        for document_id in range(start, stop):
-            document = generate_random_document(document_id)
-            document['_op_type'] = 'create'
+        for gap_start, gap_stop in checkpoint.missing(start, stop):
+            logger.info(f'inserting ids {gap_start} - {gap_stop - 1}')
+
+            for chunk_start in range(gap_start, gap_stop, CHUNK_SIZE):
+                chunk_stop = min(chunk_start + CHUNK_SIZE, gap_stop)
+
+                for document_id in range(chunk_start, chunk_stop):
+                    document = generate_random_document(
+                        document_id,
+                        enrich=not pipeline
+                    )
+                    document['_op_type'] = 'create'
+                    document['_id'] = document_id
 
-            documents.append(document)
-            total_inserted += 1
+                    documents.append(document)
 
-            if (
-                len(documents) == CHUNK_SIZE or
-                document_id == stop - 1 and documents
-            ):
-                _ = bulk(es_client, documents, index=index)
+                # 409 - the document was acknowledged before the checkpoint
+                # was written (interrupted run), creates are idempotent
+                _ = throttled_bulk(
+                    es_client,
+                    documents,
+                    throttle,
+                    index=index,
+                    ignore_status=(409,),
+                    **kwargs
+                )
+                checkpoint.add(chunk_start, chunk_stop)
+                total_inserted += len(documents)
                 documents.clear()
-                logger.info(f'total inserted: {total_inserted}')
+                logger.info(f'total inserted: {total_inserted}', extra=PROGRESS)
+
+        logger.info(
+            f'ids {start} - {stop - 1}: {total_inserted} inserted, '
+            f'{documents_count - total_inserted} acknowledged before, '
+            f'checkpoint: {checkpoint.path}'
+        )
+
+
+@cli.command('create_ingest_pipeline')
+@click.option('--pipeline', type=str, default=c.ES_CATALOG_PIPELINE_NAME)
+def create_ingest_pipeline(pipeline: str) -> None:
+    with ElasticsearchClient() as es_client:
+        result = es_client.ingest.put_pipeline(
+            id=pipeline,
+            body=get_pipeline_config()
+        )
+        logger.info(result)
+        logger.info(f'Ingest pipeline "{pipeline}" created successfully')
+
+
+@cli.command('benchmark_ingest')
+@click.option(
+    '--index',
+    type=str,
+    default=f'{c.ES_CATALOG_INDEX_NAME}_ingest_benchmark'
+)
+@click.option('--documents_count', type=int, default=100_000)
+@click.option('--pipeline', type=str, default=c.ES_CATALOG_PIPELINE_NAME)
+def benchmark_ingest(index: str, documents_count: int, pipeline: str) -> None:
+    # route -> (node type, server side enrichment)
+    routes: dict[str, tuple[str, bool]] = {
+        'client': ('ingest', False),
+        'pipeline': ('ingest', True),
+        'data': ('data', False),
+    }
+    results: dict[str, tuple[float, int]] = {}
+
+    # the documents are generated once, only the enrichment and
+    # the indexing are timed
+    logger.info(f'generating {documents_count} documents')
+    documents: list[dict] = [
+        generate_random_document(document_id, enrich=False)
+        for document_id in range(1, documents_count + 1)
+    ]
+
+    with ElasticsearchClient() as es_client:
+        if es_client.indices.exists(index=index):
+            raise RuntimeError(f'Index "{index}" already exists') from None
+        _check_pipeline(es_client, pipeline)
+
+        for route, (node_type, use_pipeline) in routes.items():
+            create_index(es_client, index, c.ES_CATALOG_INDEX_CONFIG)
+            kwargs = {'pipeline': pipeline} if use_pipeline else {}
+
+            try:
+                with ElasticsearchClient(es_node_type=node_type) as route_client:
+                    start_time = monotonic()
+
+                    for chunk_start in range(0, documents_count, CHUNK_SIZE):
+                        actions = []
+                        for document in documents[chunk_start:chunk_start + CHUNK_SIZE]:
+                            action = dict(document)
+                            if not use_pipeline:
+                                enrich_document(action)
+                            action['_op_type'] = 'create'
+                            action['_id'] = document['clothing_item_id']
+                            actions.append(action)
+
+                        _ = bulk(route_client, actions, index=index, **kwargs)
+
+                    elapsed = monotonic() - start_time
+
+                es_client.indices.refresh(index=index)
+                indexed = es_client.count(index=index)['count']
+            finally:
+                # the scratch index is not left behind by a failed route
+                es_client.indices.delete(index=index, ignore=404)
+
+            results[route] = (elapsed, indexed)
+            logger.info(
+                f'route: {route}, time: {elapsed:.2f} s, '
+                f'{documents_count / elapsed:.1f} docs/sec, indexed: {indexed}'
+            )
+
+    logger.info(
+        f'\n{"route":<10} {"time, s":>9} {"docs/sec":>10} {"indexed":>9}\n' +
+        '\n'.join(
+            f'{route:<10} {elapsed:>9.2f} '
+            f'{documents_count / elapsed:>10.1f} {indexed:>9}'
+            for route, (elapsed, indexed) in results.items()
+        )
+    )
+
+
+@cli.command('rebuild_index')
+@click.option('--alias', type=str, default=c.ES_CATALOG_INDEX_NAME)
+@click.option('--slices', type=str, default='auto')
+@click.option(
+    '--requests_per_second',
+    type=float,
+    default=-1,
+    help='reindex throttling, -1 - unlimited'
+)
+@click.option('--poll_interval', type=float, default=5.0, help='s')
+@click.option(
+    '--checkpoint',
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=None,
+    help='acknowledged id ranges, default - logs/checkpoint_<alias>.json'
+)
+@click.option(
+    '--observe',
+    type=float,
+    default=30.0,
+    help='s, search latency is measured before and after the alias swap'
+)
+@click.option(
+    '--force',
+    is_flag=True,
+    default=False,
+    help=(
+        'swap the alias (and delete the source index on the first rebuild) '
+        'even if the documents count differs or the index is not green'
+    )
+)
+def rebuild_index(
+    alias: str,
+    slices: str,
+    requests_per_second: float,
+    poll_interval: float,
+    checkpoint: t.Optional[Path],
+    observe: float,
+    force: bool
+) -> None:
+    index = f'{alias}_{datetime.now():%Y%m%d_%H%M%S}'
+    # reindex into a new index without replicas and refreshes,
+    # the config values are restored before the alias swap
+    settings = deepcopy(c.ES_CATALOG_INDEX_CONFIG['settings'])
+    settings['number_of_replicas'] = 0
+    settings['index']['refresh_interval'] = '-1'
+
+    with ElasticsearchClient() as es_client:
+        if es_client.indices.exists_alias(name=alias):
+            sources = list(es_client.indices.get_alias(name=alias))
+            if len(sources) != 1:
+                raise RuntimeError(
+                    f'Alias "{alias}" points to {len(sources)} indices'
+                ) from None
+            source, is_alias = sources[0], True
+        elif es_client.indices.exists(index=alias):
+            # the first rebuild replaces the concrete index by an alias
+            source, is_alias = alias, False
+        else:
+            raise RuntimeError(f'Index "{alias}" does not exist') from None
+
+        # the acknowledged ids of the source move to the new index
+        checkpoint = _get_checkpoint(es_client, alias, checkpoint)
+
+        create_index(
+            es_client,
+            index,
+            {
+                'settings': settings,
+                'mappings': c.ES_CATALOG_INDEX_CONFIG['mappings'],
+            }
+        )
+        logger.info(f'reindex "{source}" -> "{index}"')
+
+        probe = SearchProbe(alias)
+        probe.start()
+        sleep(observe)
+        probe.phase = 'reindex'
+        probe.pop_window()
+
+        task_id = es_client.reindex(
+            body={
+                'source': {'index': source, 'size': CHUNK_SIZE},
+                'dest': {'index': index, 'op_type': 'create'},
+            },
+            slices=slices,
+            requests_per_second=requests_per_second,
+            wait_for_completion=False
+        )['task']
+
+        start_time = monotonic()
+        created = 0
+
+        while 1:
+            sleep(poll_interval)
+            task: dict = es_client.tasks.get(task_id=task_id)
+            status: dict = task['task']['status']
+            elapsed = monotonic() - start_time
+            window = probe.pop_window()
+
+            logger.info(
+                f'reindexed: {status["created"]:>9} / {status["total"]}, '
+                f'{(status["created"] - created) / poll_interval:>9.1f} docs/sec, '
+                f'search avg: {window.avg:>7.2f} ms, '
+                f'p99: {window.percentile(99):>5} ms'
+            )
+            created = status['created']
+
+            if task['completed']:
+                break
+
+        error = task.get('error') or task.get('response', {}).get('failures')
+        if error:
+            probe.stop()
+            raise RuntimeError(f'Reindex failed: {error}') from None
+
+        config_settings = c.ES_CATALOG_INDEX_CONFIG['settings']
+        es_client.indices.put_settings(
+            index=index,
+            body={
+                'index': {
+                    'number_of_replicas': config_settings['number_of_replicas'],
+                    'refresh_interval': config_settings['index']['refresh_interval'],
+                }
+            }
+        )
+        es_client.indices.refresh(index=index)
+        # 408 - not green within the timeout, the body has `timed_out`
+        health: dict = es_client.cluster.health(
+            index=index,
+            wait_for_status='green',
+            timeout='30m',
+            ignore=408
+        )
+
+        source_count = es_client.count(index=source)['count']
+        index_count = es_client.count(index=index)['count']
+
+        problems: list[str] = []
+        if health['timed_out']:
+            problems.append(f'"{index}" health is {health["status"]}, not green')
+        if source_count != index_count:
+            # writes to the source index during the reindex are not copied
+            problems.append(
+                f'documents count mismatch: "{source}" - {source_count}, '
+                f'"{index}" - {index_count}'
+            )
+
+        if problems and not force:
+            probe.stop()
+            raise RuntimeError(
+                f'Alias swap aborted: {"; ".join(problems)}. '
+                f'"{source}" is kept, "{index}" is left for inspection, '
+                f'rerun with --force to swap anyway'
+            ) from None
+        for problem in problems:
+            logger.warning(f'{problem}, swapping anyway (--force)')
+
+        actions: list[dict] = [{'add': {'index': index, 'alias': alias}}]
+        if is_alias:
+            actions.append({'remove': {'index': source, 'alias': alias}})
+        else:
+            actions.append({'remove_index': {'index': source}})
+
+        probe.phase = 'swap'
+        es_client.indices.update_aliases(body={'actions': actions})
+        checkpoint.rebind(_get_index_uuid(es_client, index))
+        sleep(poll_interval)
+        probe.phase = 'after'
+        sleep(observe)
+        probe.stop()
+
+        if not is_alias:
+            logger.info(f'index "{source}" replaced by alias "{alias}"')
+
+        logger.info(
+            f'\nindex "{index}" rebuilt, alias "{alias}" swapped'
+            f'\nreindex time: {elapsed:.2f} s, '
+            f'{index_count / elapsed:.1f} docs/sec'
+            f'\nsearch latency:\n{probe.summary()}'
+        )
+
+
+@cli.command('export_index')
+@click.option('--index', type=str, default=c.ES_CATALOG_INDEX_NAME)
+@click.option(
+    '--output_dir',
+    type=click.Path(file_okay=False, path_type=Path),
+    default=None,
+    help='default - export/<index>'
+)
+@click.option('--workers', type=int, default=os.cpu_count())
+@click.option('--batch_size', type=int, default=CHUNK_SIZE)
+@click.option('--keep_alive', type=str, default='5m')
+def export_index(
+    index: str,
+    output_dir: t.Optional[Path],
+    workers: int,
+    batch_size: int,
+    keep_alive: str
+) -> None:
+    output_dir = output_dir or c.ES_EXPORT_DIR / index
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    with ElasticsearchClient() as es_client:
+        pit_id = es_client.open_point_in_time(
+            index=index,
+            keep_alive=keep_alive
+        )['id']
+        start_time = monotonic()
+        total_exported = 0
+
+        try:
+            # one slice per worker process, each worker has its own client
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(
+                        export_slice,
+                        index,
+                        pit_id,
+                        slice_id,
+                        workers,
+                        output_dir / f'{index}-{slice_id:03d}.ndjson.gz',
+                        batch_size,
+                        keep_alive
+                    )
+                    for slice_id in range(workers)
+                ]
+
+                for future in as_completed(futures):
+                    slice_id, exported, elapsed = future.result()
+                    total_exported += exported
+                    logger.info(
+                        f'slice {slice_id}: {exported} documents, '
+                        f'{elapsed:.2f} s, {exported / elapsed:.1f} docs/sec'
+                    )
+        finally:
+            es_client.close_point_in_time(body={'id': pit_id})
+
+        elapsed = monotonic() - start_time
+        logger.info(
+            f'total exported: {total_exported}, {elapsed:.2f} s, '
+            f'{total_exported / elapsed:.1f} docs/sec, output: {output_dir}'
+        )
 
 
 @cli.command('start_random_search')
@@ -195,17 +720,106 @@ def insert_test_data(index: str, documents_count: int) -> None:
 @click.option('--offset', type=int, default=0)
 @click.option('--size', type=int, default=100)
 @click.option('--filters_count', type=int, default=7)
+@click.option(
+    '--slow_query_threshold',
+    type=int,
+    default=c.ES_SLOW_QUERY_THRESHOLD,
+    help='ms, queries slower than threshold are written to the slow query log'
+)
+@click.option('--shapes_limit', type=int, default=25)
+@click.option(
+    '--stats_interval',
+    type=float,
+    default=5.0,
+    help='s, cluster stats sampling interval, 0 - disabled'
+)
+@click.option(
+    '--profile_sample_rate',
+    '--profile-sample-rate',
+    'profile_sample_rate',
+    type=click.FloatRange(0, 1),
+    default=0.0,
+    help='fraction of queries sent with "profile": true'
+)
+@click.option(
+    '--processes',
+    type=click.IntRange(min=1),
+    default=1,
+    help='worker processes, each with its own client and RNG seed'
+)
+@click.option('--seed', type=int, default=None, help='base RNG seed')
+@click.option(
+    '--report_interval',
+    type=float,
+    default=10.0,
+    help='s, reporting window of the --processes mode'
+)
+@click.option(
+    '--min_hits',
+    type=click.IntRange(min=0),
+    default=0,
+    help='lower bound of the estimated hits count, see --max_hits'
+)
+@click.option(
+    '--max_hits',
+    type=click.IntRange(min=0),
+    default=0,
+    help='upper bound of the estimated hits count (shadow index), 0 - disabled'
+)
+@click.option(
+    '--shadow_size',
+    type=click.IntRange(min=1),
+    default=100_000,
+    help='documents in the shadow index, a sample scaled to the index size'
+)
+@click.option(
+    '--shadow_source',
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+    default=None,
+    help='export_index output directory, default - the workload generator'
+)
+@click.option(
+    '--track_total_hits',
+    is_flag=True,
+    default=False,
+    help='exact hits count above 10000 for the hits buckets'
+)
 def start_random_search(
     index: str,
     offset: int,
     size: int,
-    filters_count: int
+    filters_count: int,
+    slow_query_threshold: int,
+    shapes_limit: int,
+    profile_sample_rate: float,
+    stats_interval: float,
+    processes: int,
+    seed: t.Optional[int],
+    report_interval: float,
+    min_hits: int,
+    max_hits: int,
+    shadow_size: int,
+    shadow_source: t.Optional[Path],
+    track_total_hits: bool
 ) -> None:
+    if min_hits and not max_hits:
+        raise click.BadParameter('requires --max_hits', param_hint='--min_hits')
+    if min_hits > max_hits > 0:
+        raise click.BadParameter(
+            f'{min_hits} is above --max_hits {max_hits}',
+            param_hint='--min_hits'
+        )
 
     def start(
         index: str,
         client: Elasticsearch,
         _avg: dict[str, list[float]],
+        _shapes: dict[str, LatencyStats],
+        _hits: dict[str, LatencyStats],
+        slow_query_log: t.TextIO,
+        profiler: SearchProfiler,
+        run_report: t.TextIO,
+        sampler: t.Optional[ClusterStatsSampler],
         from_: int = 0,
         size: int = 100
     ) -> None:
@@ -216,8 +830,14 @@ def start_random_search(
         start_time = time()
 
         while 1:
-            flag += 1
-            query, sort = generate_random_search_query(filters_count=filters_count)
+            if shadow:
+                query, sort, _ = generate_search_query_by_hits(
+                    shadow, min_hits, max_hits, filters_count=filters_count
+                )
+            else:
+                query, sort = generate_random_search_query(filters_count=filters_count)
+            shape = get_query_shape(query, sort)
+            profile = random() < profile_sample_rate
 
             start_time_ns = time_ns()
 
@@ -228,9 +848,17 @@ def start_random_search(
                 size=size,
                 request_timeout=30,
                 sort=sort,
+                profile=profile,
+                track_total_hits=track_total_hits or None,
                 _source_includes=['clothing_item_id', ]
             )
 
+            # profiled queries are slower, keep them out of the latency stats
+            if profile:
+                profiler.add(response['profile'], query, sort)
+                continue
+
+            flag += 1
             search_time = response['took']
             end_time = time() - start_time
             end_time_ns = (time_ns() - start_time_ns) // 1_000_000
@@ -238,6 +866,20 @@ def start_random_search(
             s_counter[search_time] += 1
             o_counter[end_time_ns] += 1
 
+            if shape not in _shapes:
+                _shapes[shape] = LatencyStats()
+            _shapes[shape].add(search_time)
+
+            hits_bucket = get_hits_bucket(response['hits']['total']['value'])
+            if hits_bucket not in _hits:
+                _hits[hits_bucket] = LatencyStats()
+            _hits[hits_bucket].add(search_time)
+
+            if search_time >= slow_query_threshold:
+                slow_query_log.write(json.dumps(get_slow_query_record(
+                    query, sort, shape, response, end_time_ns, from_, size
+                )) + '\n')
+
             if flag == threshold:
                 s_total = 0
                 o_total = 0
@@ -254,6 +896,17 @@ def start_random_search(
                 _avg['s_avg'].append(s_avg)
                 _avg['o_avg'].append(o_avg)
 
+                cluster = sampler.pop_window() if sampler else {}
+                write_run_report(
+                    run_report,
+                    {
+                        'search': LatencyStats(s_counter),
+                        'total': LatencyStats(o_counter),
+                    },
+                    cluster,
+                    window_time=round(end_time, 2)
+                )
+
                 s_counter.clear()
                 o_counter.clear()
                 flag = 0
@@ -264,133 +917,645 @@ def start_random_search(
                     f'avg search time: {s_avg:>5.2f} ms, '
                     f'avg overhead time: {o_avg:>5.2f} ms'
                 )
+                if cluster:
+                    logger.info(
+                        f'cluster: {ClusterStatsSampler.format_window(cluster)}'
+                    )
+
+    if seed is not None:
+        seed_generators(seed)
+
+    shadow = _get_shadow_index(index, shadow_size, shadow_source) if max_hits else None
+
+    sampler = ClusterStatsSampler(stats_interval) if stats_interval else None
+    if sampler:
+        sampler.start()
+
+    if processes > 1:
+        with open(c.ES_SLOW_QUERY_LOG, 'a', buffering=1) as slow_query_log, \
+                open(_get_run_report_path('start_random_search'), 'w') as run_report:
+            _start_random_search_processes(
+                processes,
+                randint(0, 2 ** 31) if seed is None else seed,
+                report_interval,
+                slow_query_log,
+                run_report,
+                sampler,
+                shapes_limit,
+                (
+                    index,
+                    offset,
+                    size,
+                    filters_count,
+                    slow_query_threshold,
+                    profile_sample_rate,
+                    report_interval,
+                    shadow,
+                    min_hits,
+                    max_hits,
+                    track_total_hits,
+                )
+            )
+        return
 
-    with ElasticsearchClient() as es_client:
+    with ElasticsearchClient() as es_client, \
+            open(c.ES_SLOW_QUERY_LOG, 'a', buffering=1) as slow_query_log, \
+            open(_get_run_report_path('start_random_search'), 'w') as run_report:
         _avg: dict[str, list[float]] = {
             's_avg': [],
             'o_avg': [],
         }
+        _shapes: dict[str, LatencyStats] = {}
+        _hits: dict[str, LatencyStats] = {}
+        profiler = SearchProfiler()
 
         try:
             start_time = time()
-            start(index, es_client, _avg, offset, size)
+            start(
+                index,
+                es_client,
+                _avg,
+                _shapes,
+                _hits,
+                slow_query_log,
+                profiler,
+                run_report,
+                sampler,
+                offset,
+                size
+            )
         except KeyboardInterrupt:
+            if sampler:
+                sampler.stop()
+
             s_avg = sum(_avg['s_avg']) / len(_avg['s_avg'])
             o_avg = sum(_avg['o_avg']) / len(_avg['o_avg'])
             end_time = time() - start_time
 
+            _log_search_summary(
+                end_time,
+                s_avg,
+                o_avg,
+                _shapes,
+                _hits,
+                shapes_limit,
+                profiler
+            )
+
+
+def _start_random_search_processes(
+    processes: int,
+    seed: int,
+    report_interval: float,
+    slow_query_log: t.TextIO,
+    run_report: t.TextIO,
+    sampler: t.Optional[ClusterStatsSampler],
+    shapes_limit: int,
+    worker_args: tuple
+) -> None:
+    queue: multiprocessing.Queue = multiprocessing.Queue()
+    stop_event = multiprocessing.Event()
+    workers: list[multiprocessing.Process] = [
+        multiprocessing.Process(
+            target=search_worker,
+            args=(worker_id, seed + worker_id, queue, stop_event, *worker_args),
+            daemon=True
+        )
+        for worker_id in range(processes)
+    ]
+    logger.info(f'starting {processes} search processes, seed: {seed}')
+
+    s_stats, o_stats = LatencyStats(), LatencyStats()
+    s_window, o_window = LatencyStats(), LatencyStats()
+    _shapes: dict[str, LatencyStats] = {}
+    _hits: dict[str, LatencyStats] = {}
+    # failed searches (transport errors), 'window' / 'total'
+    errors = Counter()
+    profiler = SearchProfiler()
+
+    def merge(kind: str, payload: dict[str, t.Any]) -> None:
+        s_window.merge(LatencyStats(payload['search']))
+        o_window.merge(LatencyStats(payload['total']))
+
+        for shape, histogram in payload['shapes'].items():
+            if shape not in _shapes:
+                _shapes[shape] = LatencyStats()
+            _shapes[shape].merge(LatencyStats(histogram))
+
+        for hits_bucket, histogram in payload['hits'].items():
+            if hits_bucket not in _hits:
+                _hits[hits_bucket] = LatencyStats()
+            _hits[hits_bucket].merge(LatencyStats(histogram))
+
+        for record in payload['slow_queries']:
+            slow_query_log.write(json.dumps(record) + '\n')
+
+        errors['window'] += payload['errors']
+
+        if kind == 'done':
+            profiler.merge(payload['profile'])
+
+    def flush_window(window_time: float) -> None:
+        cluster = sampler.pop_window() if sampler else {}
+        write_run_report(
+            run_report,
+            {'search': s_window, 'total': o_window},
+            cluster,
+            window_time=round(window_time, 2),
+            processes=processes,
+            errors=errors['window']
+        )
+        if errors['window']:
+            logger.warning(f'search errors: {errors["window"]}')
+
+        if s_window.count:
             logger.info(
-                f'\ntotal time: {end_time:>21.2f} s'
-                f'\ntotal avg search time: {s_avg:>9.2f} ms'
-                f'\ntotal avg overhead time: {o_avg:>7.2f} ms'
+                f'total time: {window_time:>5.2f} s, '
+                f'qps: {s_window.count / window_time:>8.1f}, '
+                f'avg search time: {s_window.avg:>5.2f} ms, '
+                f'p99 search time: {s_window.percentile(99):>4} ms, '
+                f'avg overhead time: {o_window.avg - s_window.avg:>5.2f} ms'
             )
+        if cluster:
+            logger.info(f'cluster: {ClusterStatsSampler.format_window(cluster)}')
+
+        s_stats.merge(s_window)
+        o_stats.merge(o_window)
+        s_window.clear()
+        o_window.clear()
+        errors['total'] += errors.pop('window', 0)
+
+    def check_workers() -> None:
+        # a worker exits before `stop_event` only on an unhandled error
+        exited = [
+            f'{worker_id} (exit code {worker.exitcode})'
+            for worker_id, worker in enumerate(workers)
+            if not worker.is_alive()
+        ]
+        if exited:
+            stop_event.set()
+            raise RuntimeError(
+                f'Search processes exited: {", ".join(exited)}, '
+                f'the results would not cover {processes} processes'
+            )
+
+    for worker in workers:
+        worker.start()
+
+    start_time = window_start = time()
+
+    try:
+        while 1:
+            try:
+                kind, _, payload = queue.get(timeout=1)
+            except Empty:
+                pass
+            else:
+                merge(kind, payload)
+
+            check_workers()
+
+            if time() - window_start >= report_interval:
+                flush_window(time() - window_start)
+                window_start = time()
+    except KeyboardInterrupt:
+        stop_event.set()
+        if sampler:
+            sampler.stop()
+
+        # every worker sends its last window and profile before exiting
+        done = 0
+        while done < processes:
+            try:
+                kind, _, payload = queue.get(timeout=1)
+            except Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    break
+                continue
+
+            merge(kind, payload)
+            done += kind == 'done'
+
+        for worker in workers:
+            worker.join()
+
+        flush_window(time() - window_start)
+        if errors['total']:
+            logger.warning(f'total search errors: {errors["total"]}')
+        _log_search_summary(
+            time() - start_time,
+            s_stats.avg,
+            o_stats.avg - s_stats.avg,
+            _shapes,
+            _hits,
+            shapes_limit,
+            profiler
+        )
+
+
+def _log_search_summary(
+    end_time: float,
+    s_avg: float,
+    o_avg: float,
+    _shapes: dict[str, LatencyStats],
+    _hits: dict[str, LatencyStats],
+    shapes_limit: int,
+    profiler: SearchProfiler
+) -> None:
+    logger.info(
+        f'\ntotal time: {end_time:>21.2f} s'
+        f'\ntotal avg search time: {s_avg:>9.2f} ms'
+        f'\ntotal avg overhead time: {o_avg:>7.2f} ms'
+    )
+
+    # query shapes with the largest total search time go first
+    shapes = sorted(
+        _shapes.items(),
+        key=lambda item: item[1].total,
+        reverse=True
+    )
+    lines = [
+        f'{stats.count:>7} {stats.avg:>8.2f} {stats.percentile(50):>6} '
+        f'{stats.percentile(99):>6} {stats.max:>6}  {shape}'
+        for shape, stats in shapes[:shapes_limit]
+    ]
+    logger.info(
+        f'\nquery shapes: {len(_shapes)}, '
+        f'slow query log: {c.ES_SLOW_QUERY_LOG}'
+        f'\n{"count":>7} {"avg, ms":>8} {"p50":>6} {"p99":>6} {"max":>6}  shape'
+        f'\n' + '\n'.join(lines)
+    )
+
+    # result-set size buckets, ascending
+    hits = sorted(_hits.items(), key=lambda item: int(item[0].split('-')[0]))
+    lines = [
+        f'{stats.count:>7} {stats.avg:>8.2f} {stats.percentile(50):>6} '
+        f'{stats.percentile(99):>6} {stats.max:>6}  {hits_bucket}'
+        for hits_bucket, stats in hits
+    ]
+    logger.info(
+        f'\nsearch time by hits:'
+        f'\n{"count":>7} {"avg, ms":>8} {"p50":>6} {"p99":>6} {"max":>6}  hits'
+        f'\n' + '\n'.join(lines)
+    )
+
+    if profiler.queries_count:
+        logger.info(f'\nsearch profile:\n{profiler.summary()}')
 
 
 @cli.command('start_random_operations')
 @click.option('--index', type=str, default=c.ES_CATALOG_INDEX_NAME)
-def start_random_operations(index: str) -> None:
+@click.option(
+    '--stats_interval',
+    type=float,
+    default=5.0,
+    help='s, cluster stats sampling interval, 0 - disabled'
+)
+@click.option('--report_interval', type=float, default=10.0, help='s')
+@click.option(
+    '--update_mode',
+    type=click.Choice(UPDATE_MODES),
+    default='full',
+    help=(
+        'full - regenerated document, partial - a few fields, '
+        'script - the same fields via the stored painless script'
+    )
+)
+@click.option(
+    '--checkpoint',
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=None,
+    help='acknowledged id ranges, default - logs/checkpoint_<index>.json'
+)
+@throttle_options
+def start_random_operations(
+    index: str,
+    stats_interval: float,
+    report_interval: float,
+    update_mode: str,
+    checkpoint: t.Optional[Path],
+    **throttle_kwargs: t.Any
+) -> None:
 
     operations: tuple[str, ...] = (
         'create',
         'update',
         'delete',
     )
-    updated_documents: dict[str, str] = dict()
-    deleted_documents: set[str] = set()
-
-    with ElasticsearchClient() as es_client:
+    # bulk latency per operation type, ms
+    _window: dict[str, LatencyStats] = {
+        operation: LatencyStats() for operation in operations
+    }
+    # per operation type: documents, bulk time (ms), bulk payload (bytes, updates)
+    _totals: dict[str, Counter] = {
+        operation: Counter() for operation in operations
+    }
+    _window_totals: dict[str, Counter] = {
+        operation: Counter() for operation in operations
+    }
+    _merges = Counter()
+
+    sampler = ClusterStatsSampler(stats_interval) if stats_interval else None
+    if sampler:
+        sampler.start()
+
+    with ElasticsearchClient() as es_client, \
+            open(_get_rate_report_path('start_random_operations'), 'w') as report, \
+            open(_get_run_report_path('start_random_operations'), 'w') as run_report:
+        throttle = _get_throttle(
+            'start_random_operations',
+            report,
+            **throttle_kwargs
+        )
+        checkpoint = _get_checkpoint(es_client, index, checkpoint)
         documents_count = es_client.count(index=index)['count']
-        logger.info(f'documents count - {documents_count}')
+        next_id = max(
+            documents_count,
+            checkpoint.high_watermark - 1,
+            _get_max_document_id(es_client, index)
+        ) + 1
+        logger.info(
+            f'documents count - {documents_count}, next id - {next_id}, '
+            f'update mode - {update_mode}'
+        )
 
-        while 1:
-            operation = choice(operations)
-            logger.info(f'operation type - "{operation}"')
+        if update_mode == 'script':
+            es_client.put_script(
+                id=c.ES_CATALOG_UPDATE_SCRIPT_ID,
+                body=c.ES_CATALOG_UPDATE_SCRIPT_CONFIG
+            )
+
+        start_time = time()
+
+        try:
+            _start_random_operations(
+                index,
+                es_client,
+                throttle,
+                checkpoint,
+                next_id,
+                operations,
+                update_mode,
+                report_interval,
+                sampler,
+                run_report,
+                _window,
+                _window_totals,
+                _totals,
+                _merges
+            )
+        except KeyboardInterrupt:
+            if sampler:
+                sampler.stop()
 
-            document_ids: list[str] = list()
-            documents: list[dict] = list()
+            for operation, totals in _window_totals.items():
+                _totals[operation].update(totals)
 
-            if operation == 'create':
-                start = documents_count + 1
-                stop = documents_count + randint(50, 100) + 1
+            lines = [
+                _format_operation_totals(operation, totals)
+                for operation, totals in _totals.items()
+            ]
+            logger.info(
+                f'\ntotal time: {time() - start_time:.2f} s, '
+                f'update mode: {update_mode}'
+                f'\n' + '\n'.join(lines) +
+                f'\nmerges: {_merges["merges"]}, '
+                f'merge time: {_merges["merge_time"]} ms, '
+                f'avg shard query time: '
+                f'{_merges["query_time"] / (_merges["query_total"] or 1):.2f} ms'
+            )
 
-                for document_id in range(start, stop):
-                    document = generate_random_document(document_id)
-                    document['_op_type'] = operation
 
-                    documents.append(document)
+def _format_operation_totals(operation: str, totals: Counter) -> str:
+    docs = totals['docs'] or 1
+    payload = f'{totals["bytes"] / docs:.0f} bytes/doc, ' if 'bytes' in totals else ''
 
-                _ = bulk(es_client, documents, index=index)
-                logger.info(f'total inserted: {len(documents)}')
-                documents_count += len(documents)
-            elif operation == 'update':
-                _count = randint(50, 100)
-                query, _ = generate_random_search_query(filters_count=4)
+    return (
+        f'{operation}: {totals["bulks"]} bulks, {totals["docs"]} docs, '
+        f'{payload}{totals["time"] / docs:.3f} ms/doc'
+    )
 
-                response: dict = es_client.search(
-                    query=query,
-                    index=index,
-                    from_=0,
-                    size=1000,
-                    _source_includes=['clothing_item_id',]   # noqa
+
+def _start_random_operations(
+    index: str,
+    es_client: Elasticsearch,
+    throttle: TokenBucket,
+    checkpoint: Checkpoint,
+    next_id: int,
+    operations: tuple[str, ...],
+    update_mode: str,
+    report_interval: float,
+    sampler: t.Optional[ClusterStatsSampler],
+    run_report: t.TextIO,
+    _window: dict[str, LatencyStats],
+    _window_totals: dict[str, Counter],
+    _totals: dict[str, Counter],
+    _merges: Counter
+) -> None:
+    updated_documents: dict[str, str] = dict()
+    deleted_documents: set[str] = set()
+    window_start = time()
+
+    while 1:
+        operation = choice(operations)
+
+        document_ids: list[str] = list()
+        documents: list[dict] = list()
+
+        if operation == 'create':
+            start = next_id
+            stop = next_id + randint(50, 100)
+
+            for document_id in range(start, stop):
+                document = generate_random_document(document_id)
+                document['_op_type'] = operation
+                document['_id'] = document_id
+
+                documents.append(document)
+
+            _, errors = throttled_bulk(
+                es_client,
+                documents,
+                throttle,
+                throttle_key=operation,
+                index=index,
+                raise_on_error=False
+            )
+            # 409 - the id exists (a reset or another checkpoint file),
+            # the conflicts are counted and the next ids skip past them
+            conflicts = {
+                str(error['create']['_id'])
+                for error in errors
+                if error['create'].get('status') == 409
+            }
+            if len(conflicts) != len(errors):
+                raise BulkIndexError(
+                    f'{len(errors) - len(conflicts)} document(s) failed to create',
+                    errors
                 )
 
-                for item in response['hits']['hits']:
-                    _id = item['_id']
-                    clothing_item_id = item['_source']['clothing_item_id']
-                    if (
-                        _id not in updated_documents and
-                        _id not in deleted_documents
-                    ):
-                        document_ids.append(_id)
-                        updated_documents[_id] = clothing_item_id
-                        _count -= 1
-
-                        if not _count:
-                            break
-
-                for document_id in document_ids:
-                    clothing_item_id = updated_documents[document_id]
-                    document = generate_random_document(clothing_item_id)
-
-                    documents.append({
-                        '_op_type': operation,
-                        '_id': document_id,
-                        'doc': document,
-                    })
-
-                _ = bulk(es_client, documents, index=index)
-                logger.info(f'total updated: {len(document_ids)}')
-            elif operation == 'delete':
-                _count = randint(50, 75)
-                query, _ = generate_random_search_query(filters_count=4)
-
-                response: dict = es_client.search(
-                    query=query,
-                    index=index,
-                    from_=0,
-                    size=1000,
-                    _source=False
+            checkpoint.add(start, stop)
+            next_id = stop
+            if conflicts:
+                documents = [
+                    document for document in documents
+                    if str(document['_id']) not in conflicts
+                ]
+                _window_totals[operation]['conflicts'] += len(conflicts)
+                next_id = max(next_id, _get_max_document_id(es_client, index) + 1)
+                logger.warning(
+                    f'{len(conflicts)} ids of {start} - {stop - 1} already exist, '
+                    f'next id - {next_id}'
                 )
 
-                for item in response['hits']['hits']:
-                    _id = item['_id']
-                    if _id not in deleted_documents:
-                        document_ids.append(_id)
-                        deleted_documents.add(_id)
-                        _count -= 1
+            logger.info(
+                f'operation type - "{operation}", total inserted: {len(documents)}',
+                extra=PROGRESS
+            )
+        elif operation == 'update':
+            _count = randint(50, 100)
+            query, _ = generate_random_search_query(filters_count=4)
+
+            response: dict = es_client.search(
+                query=query,
+                index=index,
+                from_=0,
+                size=1000,
+                _source_includes=['clothing_item_id',]   # noqa
+            )
+
+            for item in response['hits']['hits']:
+                _id = item['_id']
+                clothing_item_id = item['_source']['clothing_item_id']
+                if (
+                    _id not in updated_documents and
+                    _id not in deleted_documents
+                ):
+                    document_ids.append(_id)
+                    updated_documents[_id] = clothing_item_id
+                    _count -= 1
+
+                    if not _count:
+                        break
+
+            for document_id in document_ids:
+                clothing_item_id = updated_documents[document_id]
+                documents.append(generate_random_update(
+                    document_id,
+                    clothing_item_id,
+                    update_mode
+                ))
+
+            _ = throttled_bulk(
+                es_client,
+                documents,
+                throttle,
+                throttle_key=operation,
+                index=index
+            )
+            logger.info(
+                f'operation type - "{operation}", total updated: {len(document_ids)}',
+                extra=PROGRESS
+            )
+        elif operation == 'delete':
+            _count = randint(50, 75)
+            query, _ = generate_random_search_query(filters_count=4)
 
-                        if not _count:
-                            break
+            response: dict = es_client.search(
+                query=query,
+                index=index,
+                from_=0,
+                size=1000,
+                _source=False
+            )
 
-                for document_id in document_ids:
-                    documents.append({
-                        '_op_type': operation,
-                        '_id': document_id,
-                    })
+            for item in response['hits']['hits']:
+                _id = item['_id']
+                if _id not in deleted_documents:
+                    document_ids.append(_id)
+                    deleted_documents.add(_id)
+                    _count -= 1
+
+                    if not _count:
+                        break
+
+            for document_id in document_ids:
+                documents.append({
+                    '_op_type': operation,
+                    '_id': document_id,
+                })
+
+            _ = throttled_bulk(
+                es_client,
+                documents,
+                throttle,
+                throttle_key=operation,
+                index=index,
+                ignore_status=(404,)
+            )
+            logger.info(
+                f'operation type - "{operation}", total deleted: {len(document_ids)}',
+                extra=PROGRESS
+            )
 
-                _ = bulk(es_client, documents, index=index, ignore_status=(404,))
-                logger.info(f'total deleted: {len(document_ids)}')
+        bulk_time = int(throttle.last_latency * 1000)
+        _window[operation].add(bulk_time)
+        _window_totals[operation].update({
+            'bulks': 1,
+            'docs': len(documents),
+            'time': bulk_time,
+        })
+        # payload size per update mode, the large create bodies are not
+        # serialized a second time
+        if operation == 'update':
+            _window_totals[operation]['bytes'] += get_bulk_payload_size(
+                es_client, documents
+            )
 
-            # cleanup
-            documents.clear()
-            document_ids.clear()
+        # cleanup
+        documents.clear()
+        document_ids.clear()
+
+        if time() - window_start >= report_interval:
+            cluster = sampler.pop_window() if sampler else {}
+            cluster_totals = ClusterStatsSampler.totals(cluster)
+            write_run_report(
+                run_report,
+                _window,
+                cluster,
+                window_time=round(time() - window_start, 2),
+                update_mode=update_mode,
+                operations={
+                    operation: dict(totals)
+                    for operation, totals in _window_totals.items()
+                },
+                cluster_totals=cluster_totals
+            )
+            logger.info(', '.join(
+                f'{operation}: {stats.count} bulks, '
+                f'avg {stats.avg:.2f} ms, p99 {stats.percentile(99)} ms'
+                for operation, stats in _window.items()
+            ))
+            logger.info(
+                _format_operation_totals('update', _window_totals['update'])
+            )
+            if cluster:
+                logger.info(
+                    f'cluster: {ClusterStatsSampler.format_window(cluster)}'
+                )
+                logger.info(
+                    f'merges: {cluster_totals["merges"]}, '
+                    f'merge time: {cluster_totals["merge_time"]} ms, '
+                    f'avg shard query time: {cluster_totals["query_avg"]} ms'
+                )
+                _merges.update({
+                    key: sum(stats[key] for stats in cluster.values())
+                    for key in ('merges', 'merge_time', 'query_total', 'query_time')
+                })
+
+            for operation, totals in _window_totals.items():
+                _totals[operation].update(totals)
+                totals.clear()
+            for stats in _window.values():
+                stats.clear()
+            window_start = time()
@@ -10,9 +10,31 @@ env = Env()
 env.read_env(path=str(BASE_DIR / '.env'), recurse=False)
 
 # logging
+# handlers are moved to background listener threads (app.logging)
+LOGGING_ASYNC: bool = env.bool('LOGGING_ASYNC', default=False)
+# s, min interval between progress lines of the hot loops
+LOGGING_PROGRESS_INTERVAL: float = env.float(
+    'LOGGING_PROGRESS_INTERVAL',
+    default=1.0
+)
+# sampled fraction of the elasticsearch transport (per request) records
+ES_TRANSPORT_LOG_SAMPLE_RATE: float = env.float(
+    'ES_TRANSPORT_LOG_SAMPLE_RATE',
+    default=1.0
+)
 LOGGING_CONFIG = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'progress': {
+            '()': 'app.logging.RateLimitFilter',
+            'interval': LOGGING_PROGRESS_INTERVAL,
+        },
+        'sampling': {
+            '()': 'app.logging.SamplingFilter',
+            'rate': ES_TRANSPORT_LOG_SAMPLE_RATE,
+        },
+    },
     'formatters': {
         'default': {
             'format': (
@@ -27,6 +49,9 @@ LOGGING_CONFIG = {
             ),
             'datefmt': '%d/%m/%Y %H:%M:%S',
         },
+        'structured': {
+            '()': 'app.logging.StructuredFormatter',
+        },
     },
     'handlers': {
         'console': {
@@ -38,7 +63,7 @@ LOGGING_CONFIG = {
         'elasticsearch': {
             'level': 'DEBUG',
             'class': 'logging.handlers.RotatingFileHandler',
-            'formatter': 'verbose',
+            'formatter': 'structured',
             'filename': BASE_DIR / 'logs' / 'elasticsearch.log',
             'encoding': 'utf-8',
             'maxBytes': 1024 * 1024 * 1024,  # (1GB)
@@ -59,11 +84,13 @@ LOGGING_CONFIG = {
     'loggers': {
         'elasticsearch': {
             'handlers': ['elasticsearch',],
+            'filters': ['sampling',],
             'propagate': False,
             'level': 'INFO',
         },
         'catalog': {
             'handlers': ['console', 'catalog',],
+            'filters': ['progress',],
             'propagate': False,
             'level': 'DEBUG',
         },
@@ -78,6 +105,10 @@ ES_INGEST_NODE_HOST: str = env.str('ES_INGEST_NODE_HOST', default='localhost')
 ES_INGEST_NODE_PORT: int = env.int('ES_INGEST_NODE_PORT', default=9203)
 ES_USER: str = env.str('ES_USER')
 ES_USER_PASSWORD: str = env.str('ES_USER_PASSWORD')
+ES_DATA_NODE_1_HOST: str = env.str('ES_DATA_NODE_1_HOST', default='localhost')
+ES_DATA_NODE_1_PORT: int = env.int('ES_DATA_NODE_1_PORT', default=9201)
+ES_DATA_NODE_2_HOST: str = env.str('ES_DATA_NODE_2_HOST', default='localhost')
+ES_DATA_NODE_2_PORT: int = env.int('ES_DATA_NODE_2_PORT', default=9202)
 # ES index
 ES_CATALOG_INDEX_NAME: str = env.str('ES_CATALOG_INDEX_NAME', default='catalog')
 ES_CATALOG_DOCUMENTS_COUNT: int = env.int(
@@ -168,3 +199,85 @@ ES_CATALOG_INDEX_CONFIG: dict[str, dict[str, t.Any]] = {
         }
     },
 }
+# ES ingest pipeline
+ES_CATALOG_PIPELINE_NAME: str = env.str(
+    'ES_CATALOG_PIPELINE_NAME',
+    default='catalog_enrichment'
+)
+ES_CATALOG_PIPELINE_CONFIG: dict[str, t.Any] = {
+    'description': 'catalog documents enrichment',
+    'processors': [
+        {
+            'set': {
+                'field': 'time_created',
+                'value': '{{{_ingest.timestamp}}}',
+                'override': False,
+            },
+        },
+        {
+            # see app.elasticsearch.utils.get_price_tier, the bounds
+            # come from the workload profile (get_pipeline_config)
+            'script': {
+                'lang': 'painless',
+                'source': (
+                    'if (ctx.price_tier == null && ctx.current_price != null) {'
+                    '  double price = ctx.current_price;'
+                    '  int tier = 0;'
+                    '  for (def bound : params.price_tier_bounds) {'
+                    '    if (price <= bound) { break; }'
+                    '    tier++;'
+                    '  }'
+                    '  ctx.price_tier = tier;'
+                    '}'
+                ),
+                'params': {
+                    'price_tier_bounds': [100, 500, 1000],
+                },
+            },
+        },
+        {
+            'gsub': {
+                'field': 'text',
+                'pattern': '\\s+',
+                'replacement': ' ',
+                'ignore_missing': True,
+            },
+        },
+        {
+            'trim': {
+                'field': 'text',
+                'ignore_missing': True,
+            },
+        },
+    ],
+}
+# ES stored scripts
+ES_CATALOG_UPDATE_SCRIPT_ID: str = 'catalog_update'
+ES_CATALOG_UPDATE_SCRIPT_CONFIG: dict[str, t.Any] = {
+    'script': {
+        'lang': 'painless',
+        'source': (
+            'if (params.containsKey("current_price")) {'
+            '  ctx._source.current_price = params.current_price;'
+            '  ctx._source.price_tier = params.price_tier;'
+            '}'
+            'if (params.containsKey("priority")) {'
+            '  ctx._source.priority = params.priority;'
+            '}'
+            'if (params.containsKey("new")) {'
+            '  ctx._source.new = params.new;'
+            '}'
+        ),
+    },
+}
+# benchmark
+WORKLOAD_PROFILE: Path = env.path(
+    'WORKLOAD_PROFILE',
+    default=BASE_DIR / 'workloads' / 'default.yml'
+)
+ES_SLOW_QUERY_THRESHOLD: int = env.int('ES_SLOW_QUERY_THRESHOLD', default=500)  # ms
+ES_SLOW_QUERY_LOG: Path = BASE_DIR / 'logs' / 'slow_queries.log'
+ES_RATE_REPORT_DIR: Path = BASE_DIR / 'logs'
+ES_CHECKPOINT_DIR: Path = BASE_DIR / 'logs'
+ES_EXPORT_DIR: Path = BASE_DIR / 'export'
+ES_RUN_REPORT_DIR: Path = BASE_DIR / 'logs'
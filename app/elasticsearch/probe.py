@@ -0,0 +1,93 @@
+from threading import Event, Lock, Thread
+from time import time_ns
+
+from elasticsearch.exceptions import TransportError
+
+from app.elasticsearch.session import ElasticsearchClient
+from app.elasticsearch.utils import generate_random_search_query
+from app.stats import LatencyStats
+
+
+class SearchProbe(Thread):
+    """
+    Background random search against `index` with its own client,
+    latency is collected per phase (e.g. "reindex", "swap", "after")
+    """
+    def __init__(
+        self,
+        index: str,
+        filters_count: int = 7,
+        size: int = 100
+    ) -> None:
+        super().__init__(daemon=True)
+        self.index = index
+        self.filters_count = filters_count
+        self.size = size
+        self.phase = 'before'
+        self.stats: dict[str, LatencyStats] = {}
+        self.errors: dict[str, int] = {}
+
+        self._window = LatencyStats()
+        self._lock = Lock()
+        self._stop_event = Event()
+
+    def run(self) -> None:
+        with ElasticsearchClient() as es_client:
+            while not self._stop_event.is_set():
+                query, sort = generate_random_search_query(
+                    filters_count=self.filters_count
+                )
+                phase = self.phase
+                start_time_ns = time_ns()
+
+                try:
+                    es_client.search(
+                        query=query,
+                        index=self.index,
+                        size=self.size,
+                        sort=sort,
+                        request_timeout=30,
+                        _source_includes=['clothing_item_id', ]
+                    )
+                except TransportError:
+                    self.errors[phase] = self.errors.get(phase, 0) + 1
+                    continue
+
+                ms = (time_ns() - start_time_ns) // 1_000_000
+
+                with self._lock:
+                    if phase not in self.stats:
+                        self.stats[phase] = LatencyStats()
+                    self.stats[phase].add(ms)
+                    self._window.add(ms)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+    def pop_window(self) -> LatencyStats:
+        """
+        Latency since the previous call
+        """
+        with self._lock:
+            window, self._window = self._window, LatencyStats()
+
+        return window
+
+    def summary(self) -> str:
+        lines: list[str] = [
+            f'{"phase":<10} {"count":>7} {"errors":>7} {"avg, ms":>8} '
+            f'{"p50":>6} {"p99":>6} {"max":>6}',
+        ]
+        phases: list[str] = list(self.stats)
+        phases.extend(phase for phase in self.errors if phase not in phases)
+
+        for phase in phases:
+            stats = self.stats.get(phase, LatencyStats())
+            lines.append(
+                f'{phase:<10} {stats.count:>7} {self.errors.get(phase, 0):>7} '
+                f'{stats.avg:>8.2f} {stats.percentile(50):>6} '
+                f'{stats.percentile(99):>6} {stats.max:>6}'
+            )
+
+        return '\n'.join(lines)
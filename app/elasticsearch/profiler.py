@@ -0,0 +1,180 @@
+import re
+import typing as t
+from collections import defaultdict
+
+
+# "[nodeId][index][shard]"
+SHARD_ID_PATTERN = re.compile(r'^\[(?P<node>[^\]]+)\]\[(?P<index>[^\]]+)\]\[(?P<shard>\d+)\]$')
+# compound lucene queries, their own time is reported as "bool"
+COMPOUND_QUERY_TYPES: tuple[str, ...] = (
+    'BooleanQuery',
+    'ConstantScoreQuery',
+    'DisjunctionMaxQuery',
+)
+
+
+class SearchProfiler:
+    """
+    Aggregates the Search Profile API trees by request clause type
+    (term, terms, range, multi_match, sort, collector) per node and shard
+    """
+    def __init__(self) -> None:
+        # (node, shard, clause type) -> [time in nanos, count]
+        self._times: dict[tuple[str, str, str], list[int]] = defaultdict(
+            lambda: [0, 0]
+        )
+        self.queries_count: int = 0
+
+    def add(
+        self,
+        profile: dict[str, t.Any],
+        query: dict[str, t.Any],
+        sort: t.Optional[list]
+    ) -> None:
+        clause_types = self._get_clause_types(query)
+        self.queries_count += 1
+
+        for shard in profile['shards']:
+            node, shard_id = self._parse_shard_id(shard['id'])
+
+            for search in shard['searches']:
+                for item in search['query']:
+                    self._add_query(node, shard_id, item, clause_types)
+
+                for collector in search['collector']:
+                    self._add(
+                        node,
+                        shard_id,
+                        'sort' if sort else 'collector',
+                        collector['time_in_nanos']
+                    )
+
+    def dump(self) -> dict[str, t.Any]:
+        """
+        Picklable state, see `merge`
+        """
+        return {
+            'times': dict(self._times),
+            'queries_count': self.queries_count,
+        }
+
+    def merge(self, dump: dict[str, t.Any]) -> None:
+        for key, (nanos, count) in dump['times'].items():
+            item = self._times[key]
+            item[0] += nanos
+            item[1] += count
+
+        self.queries_count += dump['queries_count']
+
+    def summary(self) -> str:
+        by_type: dict[str, list[int]] = defaultdict(lambda: [0, 0])
+        by_node: dict[tuple[str, str], list[int]] = defaultdict(lambda: [0, 0])
+
+        for (node, shard_id, clause_type), (nanos, count) in self._times.items():
+            by_type[clause_type][0] += nanos
+            by_type[clause_type][1] += count
+            by_node[(node, clause_type)][0] += nanos
+            by_node[(node, clause_type)][1] += count
+
+        lines = [
+            f'profiled queries: {self.queries_count}',
+            f'{"clause":<12} {"total, ms":>12} {"count":>8} {"avg, ms":>9}',
+        ]
+        lines.extend(
+            self._format_line(clause_type, nanos, count)
+            for clause_type, (nanos, count) in sorted(
+                by_type.items(), key=lambda item: -item[1][0]
+            )
+        )
+
+        lines.append('by node:')
+        lines.extend(
+            self._format_line(clause_type, nanos, count, node)
+            for (node, clause_type), (nanos, count) in sorted(by_node.items())
+        )
+
+        lines.append('by shard:')
+        lines.extend(
+            self._format_line(clause_type, nanos, count, f'{node} {shard_id}')
+            for (node, shard_id, clause_type), (nanos, count) in sorted(
+                self._times.items()
+            )
+        )
+
+        return '\n'.join(lines)
+
+    def _add(
+        self,
+        node: str,
+        shard_id: str,
+        clause_type: str,
+        nanos: int
+    ) -> None:
+        item = self._times[(node, shard_id, clause_type)]
+        item[0] += nanos
+        item[1] += 1
+
+    def _add_query(
+        self,
+        node: str,
+        shard_id: str,
+        item: dict[str, t.Any],
+        clause_types: dict[str, str]
+    ) -> None:
+        children = item.get('children') or []
+
+        if not children:
+            field = item['description'].lstrip('+#(').split(':', 1)[0]
+            clause_type = clause_types.get(field, item['type'])
+            self._add(node, shard_id, clause_type, item['time_in_nanos'])
+            return
+
+        own_time = item['time_in_nanos'] - sum(
+            child['time_in_nanos'] for child in children
+        )
+        if item['type'] in COMPOUND_QUERY_TYPES:
+            self._add(node, shard_id, 'bool', max(own_time, 0))
+
+        for child in children:
+            self._add_query(node, shard_id, child, clause_types)
+
+    @staticmethod
+    def _get_clause_types(query: dict[str, t.Any]) -> dict[str, str]:
+        """
+        field -> request clause type
+        """
+        clauses = query['bool']['filter']
+        if isinstance(clauses, dict):
+            clauses = [clauses, ]
+
+        clause_types: dict[str, str] = {}
+        for clause in clauses:
+            clause_type, body = next(iter(clause.items()))
+            if clause_type == 'multi_match':
+                for field in body['fields']:
+                    clause_types[field] = clause_type
+            else:
+                for field in body:
+                    clause_types[field] = clause_type
+
+        return clause_types
+
+    @staticmethod
+    def _parse_shard_id(shard_id: str) -> tuple[str, str]:
+        match = SHARD_ID_PATTERN.match(shard_id)
+        if match is None:
+            return shard_id, shard_id
+
+        return match['node'], f'{match["index"]}[{match["shard"]}]'
+
+    @staticmethod
+    def _format_line(
+        clause_type: str,
+        nanos: int,
+        count: int,
+        prefix: str = ''
+    ) -> str:
+        ms = nanos / 1_000_000
+        line = f'{clause_type:<12} {ms:>12.2f} {count:>8} {ms / count:>9.3f}'
+
+        return f'{prefix} {line}' if prefix else line
@@ -0,0 +1,174 @@
+import typing as t
+from threading import Event, Lock, Thread
+
+from elasticsearch import Elasticsearch
+from elasticsearch.exceptions import TransportError
+
+from app.elasticsearch.session import ElasticsearchClient
+from app.logging import logger
+
+
+# cumulative node counters, reported as a delta per window
+COUNTERS: tuple[str, ...] = (
+    'search_rejected',
+    'write_rejected',
+    'gc_young_count',
+    'gc_young_time',
+    'gc_old_count',
+    'gc_old_time',
+    'query_cache_hits',
+    'query_cache_misses',
+    'request_cache_hits',
+    'request_cache_misses',
+    'merges',
+    'merge_time',
+    'query_total',
+    'query_time',
+)
+
+
+class ClusterStatsSampler(Thread):
+    """
+    Polls `_nodes/stats` and `_cat/thread_pool` with its own client in
+    the background, samples are aggregated per reporting window
+    (see `pop_window`), so the workload loop only takes a lock
+    """
+    def __init__(self, interval: float = 5.0) -> None:
+        super().__init__(daemon=True)
+        self.interval = interval
+
+        self._samples: list[dict[str, dict[str, int]]] = []
+        self._last_sample: t.Optional[dict[str, dict[str, int]]] = None
+        self._lock = Lock()
+        self._stop_event = Event()
+
+    def run(self) -> None:
+        with ElasticsearchClient() as es_client:
+            while not self._stop_event.is_set():
+                try:
+                    sample = self._sample(es_client)
+                except TransportError as e:
+                    logger.warning(f'cluster stats sampling failed: {e}')
+                else:
+                    with self._lock:
+                        self._samples.append(sample)
+
+                self._stop_event.wait(self.interval)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+    def pop_window(self) -> dict[str, dict[str, t.Any]]:
+        """
+        Per node stats since the previous call:
+        max queue depth, counter deltas, cache hit rates, segments count
+        """
+        with self._lock:
+            samples, self._samples = self._samples, []
+
+        if not samples:
+            return {}
+
+        baseline = self._last_sample or samples[0]
+        self._last_sample = last = samples[-1]
+        window: dict[str, dict[str, t.Any]] = {}
+
+        for node, stats in last.items():
+            first = baseline.get(node, stats)
+            node_window: dict[str, t.Any] = {
+                'samples': len(samples),
+                'search_queue_max': max(
+                    sample.get(node, stats)['search_queue'] for sample in samples
+                ),
+                'write_queue_max': max(
+                    sample.get(node, stats)['write_queue'] for sample in samples
+                ),
+                'segments_count': stats['segments_count'],
+            }
+            for key in COUNTERS:
+                node_window[key] = stats[key] - first[key]
+
+            for cache in ('query_cache', 'request_cache'):
+                hits = node_window[f'{cache}_hits']
+                total = hits + node_window[f'{cache}_misses']
+                node_window[f'{cache}_hit_rate'] = (
+                    round(hits / total, 4) if total else None
+                )
+
+            window[node] = node_window
+
+        return window
+
+    @staticmethod
+    def format_window(window: dict[str, dict[str, t.Any]]) -> str:
+        return ', '.join(
+            f'{node}: queue s/w {stats["search_queue_max"]}/'
+            f'{stats["write_queue_max"]}, '
+            f'rejected s/w {stats["search_rejected"]}/{stats["write_rejected"]}, '
+            f'gc old {stats["gc_old_count"]}, '
+            f'segments {stats["segments_count"]}'
+            for node, stats in sorted(window.items())
+        )
+
+    @staticmethod
+    def totals(window: dict[str, dict[str, t.Any]]) -> dict[str, float]:
+        """
+        Cluster wide merge load and shard level query latency of a window
+        """
+        merges = sum(stats['merges'] for stats in window.values())
+        merge_time = sum(stats['merge_time'] for stats in window.values())
+        query_total = sum(stats['query_total'] for stats in window.values())
+        query_time = sum(stats['query_time'] for stats in window.values())
+
+        return {
+            'merges': merges,
+            'merge_time': merge_time,
+            'query_total': query_total,
+            'query_avg': round(query_time / query_total, 2) if query_total else 0.0,
+        }
+
+    @staticmethod
+    def _sample(es_client: Elasticsearch) -> dict[str, dict[str, int]]:
+        nodes_stats: dict = es_client.nodes.stats(
+            metric='indices,jvm',
+            index_metric='segments,query_cache,request_cache,merge,search'
+        )
+        thread_pool: list[dict] = es_client.cat.thread_pool(
+            thread_pool_patterns='search,write',
+            h='node_name,name,queue,rejected',
+            format='json'
+        )
+
+        sample: dict[str, dict[str, int]] = {}
+
+        for node in nodes_stats['nodes'].values():
+            indices = node['indices']
+            collectors = node['jvm']['gc']['collectors']
+            sample[node['name']] = {
+                'search_queue': 0,
+                'write_queue': 0,
+                'search_rejected': 0,
+                'write_rejected': 0,
+                'gc_young_count': collectors['young']['collection_count'],
+                'gc_young_time': collectors['young']['collection_time_in_millis'],
+                'gc_old_count': collectors['old']['collection_count'],
+                'gc_old_time': collectors['old']['collection_time_in_millis'],
+                'segments_count': indices['segments']['count'],
+                'query_cache_hits': indices['query_cache']['hit_count'],
+                'query_cache_misses': indices['query_cache']['miss_count'],
+                'request_cache_hits': indices['request_cache']['hit_count'],
+                'request_cache_misses': indices['request_cache']['miss_count'],
+                'merges': indices['merges']['total'],
+                'merge_time': indices['merges']['total_time_in_millis'],
+                'query_total': indices['search']['query_total'],
+                'query_time': indices['search']['query_time_in_millis'],
+            }
+
+        for item in thread_pool:
+            if item['node_name'] in sample:
+                node = sample[item['node_name']]
+                node[f'{item["name"]}_queue'] = int(item['queue'])
+                node[f'{item["name"]}_rejected'] = int(item['rejected'])
+
+        return sample
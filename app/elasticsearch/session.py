@@ -10,18 +10,32 @@ from app.logging import logger
 
 class ElasticsearchClient:
     _es_client: Elasticsearch = None
-    _es_node_types: dict[str, dict[str, str]] = {
-        'master': {
-            'host': c.ES_MASTER_NODE_HOST,
-            'port': c.ES_MASTER_NODE_PORT,
-        },
-        'ingest': {
-            'host': c.ES_INGEST_NODE_HOST,
-            'port': c.ES_INGEST_NODE_PORT,
-        }
+    # node type -> nodes, the requests are balanced between the nodes
+    _es_node_types: dict[str, list[dict[str, str]]] = {
+        'master': [
+            {
+                'host': c.ES_MASTER_NODE_HOST,
+                'port': c.ES_MASTER_NODE_PORT,
+            },
+        ],
+        'ingest': [
+            {
+                'host': c.ES_INGEST_NODE_HOST,
+                'port': c.ES_INGEST_NODE_PORT,
+            },
+        ],
+        'data': [
+            {
+                'host': c.ES_DATA_NODE_1_HOST,
+                'port': c.ES_DATA_NODE_1_PORT,
+            },
+            {
+                'host': c.ES_DATA_NODE_2_HOST,
+                'port': c.ES_DATA_NODE_2_PORT,
+            },
+        ],
     }
-    _es_host: str = None
-    _es_port: str = None
+    _es_nodes: list[dict[str, str]] = None
     _es_user: str = None
     _es_user_password: str = None
 
@@ -34,11 +48,10 @@ class ElasticsearchClient:
         es_node_type: str = 'master'
     ) -> None:
         if es_host is None or es_port is None:
-            es_host = self._es_node_types[es_node_type]['host']
-            es_port = self._es_node_types[es_node_type]['port']
+            self._es_nodes = self._es_node_types[es_node_type]
+        else:
+            self._es_nodes = [{'host': es_host, 'port': es_port}, ]
 
-        self._es_host = es_host
-        self._es_port = es_port
         self._es_user = es_user or c.ES_USER
         self._es_user_password = es_user_password or c.ES_USER_PASSWORD
 
@@ -58,7 +71,7 @@ class ElasticsearchClient:
 
     def _session_maker(self) -> Elasticsearch:
         client: Elasticsearch = Elasticsearch(
-            f'http://{self._es_host}:{self._es_port}',
+            [f'http://{node["host"]}:{node["port"]}' for node in self._es_nodes],
             http_auth=(self._es_user, self._es_user_password),
         )
 
@@ -1,21 +1,149 @@
+import gzip
+import json
 import typing as t
+from copy import deepcopy
 from datetime import datetime
 from functools import partial
-from random import choice, randint, shuffle
+from pathlib import Path
+from random import choice, randint, random, sample, seed
+from time import monotonic, sleep
 
 from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk as _bulk
+from elasticsearch.exceptions import TransportError
+from elasticsearch.helpers import bulk as _bulk, expand_action
 from faker import Faker
 
+from app import config as c
+from app.elasticsearch.session import ElasticsearchClient
 from app.logging import logger
+from app.throttle import TokenBucket
+from app.workload import load_workload, Workload
+
+if t.TYPE_CHECKING:
+    # numpy is only needed by start_random_search --max_hits
+    from app.shadow import ShadowIndex
 
 
 fake = Faker(['ru_RU', 'en_US',])  # noqa
 
 CHUNK_SIZE: int = 1000
-GENDERS: tuple[str, ...] = ('FEMALE', 'MALE',)
+UPDATE_MODES: tuple[str, ...] = ('full', 'partial', 'script',)
+UPDATE_FIELDS: tuple[str, ...] = ('current_price', 'priority', 'new',)
 
 bulk: t.Callable = partial(_bulk, chunk_size=CHUNK_SIZE)
+# document / query distributions, see `set_workload`
+workload: Workload = load_workload(c.WORKLOAD_PROFILE)
+
+
+def set_workload(path: Path) -> None:
+    global workload
+    workload = load_workload(path)
+    logger.info(f'workload profile: {workload.name}')
+
+
+def seed_generators(value: t.Optional[int]) -> None:
+    seed(value)
+    fake.seed_instance(value)
+
+
+def throttled_bulk(
+    client: Elasticsearch,
+    actions: list[dict],
+    throttle: TokenBucket,
+    throttle_key: str = '',
+    **kwargs: t.Any
+) -> tuple[int, t.Union[int, list]]:
+    """
+    `throttle_key` - request type with its own backpressure baseline
+    """
+    throttle.acquire(len(actions))
+
+    while 1:
+        start = monotonic()
+        try:
+            # rejected items (429) are retried by the bulk helper itself,
+            # the retries show up as a slower response
+            result = bulk(client, actions, max_retries=3, **kwargs)
+        except TransportError as e:
+            if e.status_code != 429:
+                raise
+
+            throttle.feedback(
+                monotonic() - start, len(actions), throttle_key, rejected=True
+            )
+            logger.warning('bulk request rejected, backing off')
+            sleep(1)
+            continue
+
+        throttle.feedback(monotonic() - start, len(actions), throttle_key)
+
+        return result
+
+
+def get_bulk_payload_size(client: Elasticsearch, actions: list[dict]) -> int:
+    """
+    Bytes (UTF-8) of the bulk request body, action metadata and source
+    lines as serialized by the client
+    """
+    serializer = client.transport.serializer
+    size = 0
+
+    for action in actions:
+        for line in expand_action(action):
+            if line is not None:
+                size += len(serializer.dumps(line).encode('utf-8')) + 1
+
+    return size
+
+
+def export_slice(
+    index: str,
+    pit_id: str,
+    slice_id: int,
+    slices: int,
+    path: Path,
+    batch_size: int = CHUNK_SIZE,
+    keep_alive: str = '5m'
+) -> tuple[int, int, float]:
+    """
+    Streams one slice of a point in time to a gzipped NDJSON file,
+    each line is a bulk helper action ({"_id": ..., **_source})
+    """
+    kwargs: dict[str, t.Any] = {}
+    if slices > 1:
+        kwargs['slice'] = {'id': slice_id, 'max': slices}
+
+    exported = 0
+    search_after: t.Optional[list] = None
+    start_time = monotonic()
+
+    with ElasticsearchClient() as client, \
+            gzip.open(path, 'wt', encoding='utf-8', compresslevel=6) as f:
+        while 1:
+            response: dict = client.search(
+                pit={'id': pit_id, 'keep_alive': keep_alive},
+                sort=[{'_shard_doc': 'asc'}, ],
+                size=batch_size,
+                search_after=search_after,
+                track_total_hits=False,
+                request_timeout=60,
+                **kwargs
+            )
+            hits: list[dict] = response['hits']['hits']
+            if not hits:
+                break
+
+            pit_id = response.get('pit_id', pit_id)
+            search_after = hits[-1]['sort']
+            exported += len(hits)
+
+            for hit in hits:
+                f.write(json.dumps({'_id': hit['_id'], **hit['_source']}))
+                f.write('\n')
+
+    logger.debug(f'{index} slice {slice_id}: {exported} documents')
+
+    return slice_id, exported, monotonic() - start_time
 
 
 def create_index(
@@ -36,19 +164,24 @@ def create_index(
 
 
 def generate_random_document(
-    clothing_item_id: t.Union[int, str]
+    clothing_item_id: t.Union[int, str],
+    enrich: bool = True,
+    with_text: bool = True
 ) -> dict[str, t.Any]:
+    """
+    enrich=False - slim document, `time_created` and `price_tier` are
+    derived and `text` is normalized by the ingest pipeline
+    with_text=False - empty `text`, scalar fields only (see ShadowIndex)
+    """
     price_tier = _get_random_price_tier()
 
-    return {
+    document = {
         'clothing_item_id': str(clothing_item_id),
-        'time_created': datetime.utcnow(),
         'gender': _get_random_gender(),
         'partner_id': _get_random_partner_id(),
         'clothing_category_id': _get_random_clothing_category_id(),
-        'price_tier': price_tier,
         'current_price': _get_random_price_by_price_tier(price_tier),
-        'text': _get_random_text(),
+        'text': _get_random_text() if with_text else '',
         'sport': _get_random_sport_flag(),
         'plus_size': _get_random_plus_size_flag(),
         'new': _get_random_new_flag(),
@@ -59,38 +192,97 @@ def generate_random_document(
         'figure_type_problem_id': _get_random_figure_type_problem_id(),
     }
 
+    if enrich:
+        enrich_document(document)
+
+    return document
+
+
+def enrich_document(document: dict[str, t.Any]) -> dict[str, t.Any]:
+    """
+    Client side version of the `ES_CATALOG_PIPELINE_CONFIG` processors
+    """
+    document['time_created'] = datetime.utcnow()
+    document['price_tier'] = get_price_tier(document['current_price'])
+    document['text'] = ' '.join(document['text'].split())
+
+    return document
+
+
+def get_price_tier(price: float) -> int:
+    """
+    Tier bounds of the workload profile `current_price.by_price_tier`
+    """
+    return workload.get_price_tier(price)
+
+
+def get_pipeline_config() -> dict[str, t.Any]:
+    """
+    `ES_CATALOG_PIPELINE_CONFIG` with the price tier bounds of the workload
+    """
+    config = deepcopy(c.ES_CATALOG_PIPELINE_CONFIG)
+
+    for processor in config['processors']:
+        if 'script' in processor:
+            processor['script']['params']['price_tier_bounds'] = (
+                workload.price_tier_bounds
+            )
+
+    return config
+
+
+def generate_random_update(
+    document_id: str,
+    clothing_item_id: t.Union[int, str],
+    update_mode: str = 'full'
+) -> dict[str, t.Any]:
+    """
+    full - the whole document is regenerated,
+    partial - `doc` with 1 - 3 of current_price (+ price_tier), priority, new,
+    script - the same fields as params of the stored update script
+    """
+    action: dict[str, t.Any] = {
+        '_op_type': 'update',
+        '_id': document_id,
+    }
+
+    if update_mode == 'full':
+        action['doc'] = generate_random_document(clothing_item_id)
+        return action
+
+    fields: dict[str, t.Any] = {}
+    for field in sample(UPDATE_FIELDS, randint(1, len(UPDATE_FIELDS))):
+        if field == 'current_price':
+            price_tier = _get_random_price_tier()
+            fields['price_tier'] = price_tier
+            fields['current_price'] = _get_random_price_by_price_tier(price_tier)
+        elif field == 'priority':
+            fields['priority'] = _get_random_priority()
+        elif field == 'new':
+            fields['new'] = _get_random_new_flag()
+
+    if update_mode == 'partial':
+        action['doc'] = fields
+    else:
+        action['script'] = {
+            'id': c.ES_CATALOG_UPDATE_SCRIPT_ID,
+            'params': fields,
+        }
+
+    return action
+
 
 def generate_random_search_query(
     filters_count: int = 5
 ) -> tuple[dict, t.Optional[dict]]:
-    fields = [
-        'partner_id',
-        'clothing_category_id',
-        'current_price',
-        'sport',
-        'plus_size',
-        'new',
-        'priority',
-        'archetypes',
-        'color_types',
-        'figure_type_id',
-        'figure_type_problem_id',
-    ]
-
     query: dict[str, dict[str, t.Any]] = {
         'bool': {
             'filter': [],
         }
     }
 
-    if not randint(0, 2):
-        field = choice(
-            (
-                'figure_type_id',
-                'figure_type_problem_id',
-                'price_tier',
-            )
-        )
+    if random() < workload.sort_probability:
+        field = workload.sort_field()
         sort = [
             {
                 field: {
@@ -102,11 +294,11 @@ def generate_random_search_query(
         sort = None
 
     # required fields
-    price_tier = _get_random_price_tier()
+    price_tier = workload.query_value('price_tier')
 
     query['bool']['filter'].append({
         'term': {
-            'gender': _get_random_gender(),
+            'gender': workload.query_value('gender'),
         }
     })
     query['bool']['filter'].append({
@@ -115,7 +307,7 @@ def generate_random_search_query(
         }
     })
 
-    if not randint(0, 11):
+    if random() < workload.text_probability:
         while 1:
             text = [i for i in _get_random_text().split() if len(i) > 5]
             if text:
@@ -135,26 +327,10 @@ def generate_random_search_query(
 
         return query, sort
 
-    # optional fields
-    shuffle(fields)
-
-    for index in range(filters_count - 2):  # gender + price tier
-        field = fields[index]
-
-        if field == 'partner_id':
-            query['bool']['filter'].append({
-                'term': {
-                    field: _get_random_partner_id(),
-                }
-            })
-        elif field == 'clothing_category_id':
-            query['bool']['filter'].append({
-                'term': {
-                    field: _get_random_clothing_category_id(),
-                }
-            })
-        elif field == 'current_price':
-            min_val, max_val = _get_random_price_range_by_price_tier(price_tier)
+    # optional fields, gender + price tier
+    for field in workload.sample_filter_fields(filters_count - 2):
+        if field == 'current_price':
+            min_val, max_val = workload.price_range(price_tier)
             query['bool']['filter'].append({
                 'range': {
                     field: {
@@ -163,115 +339,86 @@ def generate_random_search_query(
                     },
                 }
             })
-        elif field == 'sport':
-            query['bool']['filter'].append({
-                'term': {
-                    field: _get_random_sport_flag(),
-                }
-            })
-        elif field == 'plus_size':
-            query['bool']['filter'].append({
-                'term': {
-                    field: _get_random_plus_size_flag(),
-                }
-            })
-        elif field == 'new':
-            query['bool']['filter'].append({
-                'term': {
-                    field: _get_random_new_flag(),
-                }
-            })
-        elif field == 'priority':
-            query['bool']['filter'].append({
-                'term': {
-                    field: _get_random_priority(),
-                }
-            })
-        elif field == 'archetypes':
-            start = randint(0, 12)
-            _range = randint(2, 4)
+        elif field in ('archetypes', 'color_types',):
             query['bool']['filter'].append({
                 'terms': {
-                    field: [
-                        i for i in range(start, start + _range)
-                    ],
+                    field: workload.query_value(field),
                 }
             })
-        elif field == 'color_types':
-            start = randint(0, 7)
-            _range = randint(2, 4)
-            query['bool']['filter'].append({
-                'terms': {
-                    field: [
-                        i for i in range(start, start + _range)
-                    ],
-                }
-            })
-        elif field == 'figure_type_id':
-            query['bool']['filter'].append({
-                'term': {
-                    field: _get_random_figure_type_id(),
-                }
-            })
-        elif field == 'figure_type_problem_id':
+        else:
             query['bool']['filter'].append({
                 'term': {
-                    field: _get_random_figure_type_problem_id(),
+                    field: workload.query_value(field),
                 }
             })
 
     return query, sort
 
 
-def _get_random_gender() -> str:
-    return GENDERS[randint(1, 30) >= 20]
-
-
-def _get_random_partner_id() -> int:
-    return randint(1, 120)
+def generate_search_query_by_hits(
+    shadow: 'ShadowIndex',
+    min_hits: int,
+    max_hits: int,
+    filters_count: int = 5,
+    attempts: int = 50
+) -> tuple[dict, t.Optional[list], t.Optional[int]]:
+    """
+    Random search query with the estimated (shadow index) hits count
+    within [min_hits, max_hits], the last candidate is returned after
+    `attempts` misses, full text queries are not estimated (None)
+    """
+    for _ in range(attempts):
+        query, sort = generate_random_search_query(filters_count=filters_count)
+        hits = shadow.estimate(query)
 
+        if hits is None or min_hits <= hits <= max_hits:
+            break
 
-def _get_random_clothing_category_id() -> int:
-    return randint(1, 50)
+    return query, sort, hits
 
 
-def _get_random_price_tier() -> int:
+def get_query_shape(query: dict, sort: t.Optional[list]) -> str:
     """
-    0, 50 %, 10 - 100
-    1, 25 %, 100 - 500
-    2, 15 %, 500 - 1000
-    3, 10 %, 1000+
+    Query shape signature, e.g.
+    filter[gender,partner_id,price_tier] sort:price_tier
+    text[text,text.english,text.russian] sort:none
     """
-    flag = randint(1, 100)
+    clauses = query['bool']['filter']
 
-    if flag <= 50:
-        return 0
-    if flag <= 75:
-        return 1
-    if flag <= 90:
-        return 2
+    if isinstance(clauses, dict):
+        kind = 'text'
+        fields = clauses['multi_match']['fields']
+    else:
+        kind = 'filter'
+        fields = [
+            field
+            for clause in clauses
+            for field in next(iter(clause.values()))
+        ]
 
-    return 3
+    sort_field = next(iter(sort[0])) if sort else 'none'
 
+    return f'{kind}[{",".join(sorted(fields))}] sort:{sort_field}'
 
-def _get_random_price_by_price_tier(price_tier: int) -> float:
-    if price_tier == 0:
-        return randint(100, 1000) / 10
-    if price_tier == 1:
-        return randint(1001, 5000) / 10
-    if price_tier == 2:
-        return randint(5001, 10000) / 10
-    if price_tier == 3:
-        return randint(10001, 50000) / 10
+
+def _get_random_gender() -> str:
+    return workload.documents['gender']()
+
+
+def _get_random_partner_id() -> int:
+    return workload.documents['partner_id']()
 
 
-def _get_random_price_range_by_price_tier(
-    price_tier: int
-) -> tuple[float, float]:
-    max_val = randint(125, (1000, 5000, 10000, 50000)[price_tier])
-    min_val = randint(100, max_val - 1)
+def _get_random_clothing_category_id() -> int:
+    return workload.documents['clothing_category_id']()
+
+
+def _get_random_price_tier() -> int:
+    return workload.documents['price_tier']()
 
-    return min_val / 10, max_val / 10
+
+def _get_random_price_by_price_tier(price_tier: int) -> float:
+    return workload.prices[price_tier]()
 
 
 def _get_random_text() -> str:
@@ -279,38 +426,32 @@ def _get_random_text() -> str:
 
 
 def _get_random_sport_flag() -> bool:
-    return randint(1, 100) > 95
+    return workload.documents['sport']()
 
 
 def _get_random_plus_size_flag() -> bool:
-    return randint(1, 100) > 90
+    return workload.documents['plus_size']()
 
 
 def _get_random_new_flag() -> bool:
-    return randint(1, 100) > 80
+    return workload.documents['new']()
 
 
 def _get_random_priority() -> int:
-    return randint(1, 10)
+    return workload.documents['priority']()
 
 
 def _get_random_archetypes() -> list[int]:
-    start = randint(0, 12)
-    _range = randint(0, 4)
-
-    return [i for i in range(start, start + _range)]
+    return workload.documents['archetypes']()
 
 
 def _get_random_color_types() -> list[int]:
-    start = randint(0, 8)
-    _range = randint(0, 3)
-
-    return [i for i in range(start, start + _range)]
+    return workload.documents['color_types']()
 
 
 def _get_random_figure_type_id() -> int:
-    return randint(1, 5)
+    return workload.documents['figure_type_id']()
 
 
 def _get_random_figure_type_problem_id() -> int:
-    return randint(1, 20)
+    return workload.documents['figure_type_problem_id']()
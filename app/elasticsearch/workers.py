@@ -0,0 +1,161 @@
+import signal
+import typing as t
+from collections import Counter, defaultdict
+from datetime import datetime
+from multiprocessing.queues import Queue
+from multiprocessing.synchronize import Event
+from random import random
+from time import time, time_ns
+
+from elasticsearch.exceptions import TransportError
+
+from app.elasticsearch.profiler import SearchProfiler
+from app.elasticsearch.session import ElasticsearchClient
+from app.elasticsearch.utils import (
+    generate_random_search_query,
+    generate_search_query_by_hits,
+    get_query_shape,
+    seed_generators
+)
+from app.logging import logger
+from app.stats import get_hits_bucket
+
+if t.TYPE_CHECKING:
+    from app.shadow import ShadowIndex
+
+
+def get_slow_query_record(
+    query: dict,
+    sort: t.Optional[list],
+    shape: str,
+    response: dict,
+    total_time: int,
+    from_: int,
+    size: int
+) -> dict[str, t.Any]:
+    return {
+        'timestamp': datetime.utcnow().isoformat(),
+        'took': response['took'],
+        'total_time': total_time,
+        'shape': shape,
+        'hits': response['hits']['total']['value'],
+        'body': {
+            'query': query,
+            'sort': sort,
+            'from': from_,
+            'size': size,
+        },
+    }
+
+
+def search_worker(
+    worker_id: int,
+    seed: int,
+    queue: Queue,
+    stop_event: Event,
+    index: str,
+    from_: int,
+    size: int,
+    filters_count: int,
+    slow_query_threshold: int,
+    profile_sample_rate: float,
+    report_interval: float,
+    shadow: t.Optional['ShadowIndex'],
+    min_hits: int,
+    max_hits: int,
+    track_total_hits: bool
+) -> None:
+    """
+    Random search loop of a `start_random_search --processes N` worker,
+    the histograms are sent to the parent process every `report_interval`
+    seconds as ('window', worker_id, payload) and once more as
+    ('done', worker_id, payload) after `stop_event` is set
+    """
+    # Ctrl+C is handled by the parent, it sets `stop_event`
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    seed_generators(seed)
+
+    profiler = SearchProfiler()
+    s_counter = Counter()
+    o_counter = Counter()
+    shapes: dict[str, Counter] = defaultdict(Counter)
+    hits: dict[str, Counter] = defaultdict(Counter)
+    slow_queries: list[dict] = []
+    # failed searches, a timeout does not stop the worker
+    errors = Counter()
+
+    def payload() -> dict[str, t.Any]:
+        return {
+            'search': dict(s_counter),
+            'total': dict(o_counter),
+            'shapes': {shape: dict(counter) for shape, counter in shapes.items()},
+            'hits': {bucket: dict(counter) for bucket, counter in hits.items()},
+            'slow_queries': list(slow_queries),
+            'errors': errors['window'],
+        }
+
+    def clear() -> None:
+        s_counter.clear()
+        o_counter.clear()
+        shapes.clear()
+        hits.clear()
+        slow_queries.clear()
+        errors.clear()
+
+    with ElasticsearchClient() as client:
+        window_start = time()
+
+        while not stop_event.is_set():
+            if time() - window_start >= report_interval:
+                queue.put(('window', worker_id, payload()))
+                clear()
+                window_start = time()
+
+            if shadow:
+                query, sort, _ = generate_search_query_by_hits(
+                    shadow, min_hits, max_hits, filters_count=filters_count
+                )
+            else:
+                query, sort = generate_random_search_query(filters_count=filters_count)
+            shape = get_query_shape(query, sort)
+            profile = random() < profile_sample_rate
+
+            start_time_ns = time_ns()
+
+            try:
+                response: dict = client.search(
+                    query=query,
+                    index=index,
+                    from_=from_,
+                    size=size,
+                    request_timeout=30,
+                    sort=sort,
+                    profile=profile,
+                    track_total_hits=track_total_hits or None,
+                    _source_includes=['clothing_item_id', ]
+                )
+            except TransportError as e:
+                errors['window'] += 1
+                logger.warning(f'search process {worker_id}: {e!r}')
+                continue
+
+            if profile:
+                profiler.add(response['profile'], query, sort)
+                continue
+
+            search_time = response['took']
+            total_time = (time_ns() - start_time_ns) // 1_000_000
+
+            s_counter[search_time] += 1
+            o_counter[total_time] += 1
+            shapes[shape][search_time] += 1
+            hits[get_hits_bucket(response['hits']['total']['value'])][search_time] += 1
+
+            if search_time >= slow_query_threshold:
+                slow_queries.append(get_slow_query_record(
+                    query, sort, shape, response, total_time, from_, size
+                ))
+
+    final = payload()
+    final['profile'] = profiler.dump()
+    queue.put(('done', worker_id, final))
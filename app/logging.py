@@ -1,4 +1,137 @@
+import atexit
+import json
 import logging
+import os
+import typing as t
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from random import random
+from time import monotonic
 
 
 logger = logging.getLogger('catalog')
+
+# progress lines of the hot loops, see RateLimitFilter
+PROGRESS: dict[str, bool] = {'progress': True}
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Passes at most one progress record (extra={'progress': True})
+    per `interval` seconds and logging call site, other records are
+    not affected
+    """
+    def __init__(self, interval: float = 1.0) -> None:
+        super().__init__()
+        self.interval = interval
+        # (path, line) -> the last passed record time
+        self._last: dict[tuple[str, int], float] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, 'progress', False):
+            return True
+
+        key = (record.pathname, record.lineno)
+        now = monotonic()
+        if now - self._last.get(key, 0.0) < self.interval:
+            return False
+
+        self._last[key] = now
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Passes a `rate` fraction of the records below WARNING
+    """
+    def __init__(self, rate: float = 1.0) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or random() < self.rate
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    JSON lines, elasticsearch transport records
+    ("%s %s [status:%s request:%.3fs]") are split into fields
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        data: dict[str, t.Any] = {
+            'timestamp': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+        }
+
+        if (
+            record.name == 'elasticsearch' and
+            isinstance(record.args, tuple) and
+            len(record.args) == 4
+        ):
+            method, url, status, duration = record.args
+            data.update({
+                'method': method,
+                'url': url,
+                'status': status,
+                'duration': round(duration, 4),
+            })
+        else:
+            data['message'] = record.getMessage()
+
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+
+        return json.dumps(data)
+
+
+class LocalQueueHandler(QueueHandler):
+    """
+    In-process queue, the record is passed as is (not pre-formatted),
+    so the listener side formatters still have `record.args`
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def start_queue_listeners(names: t.Iterable[str]) -> list[QueueListener]:
+    """
+    Moves the handlers of the `names` loggers to background listener
+    threads, the logging call only puts the record into a queue
+    """
+    listeners: list[QueueListener] = []
+    # (logger, queue handler, the original handlers)
+    installed: list[tuple[logging.Logger, logging.Handler, list[logging.Handler]]] = []
+
+    for name in names:
+        _logger = logging.getLogger(name)
+        handlers = list(_logger.handlers)
+        queue: SimpleQueue = SimpleQueue()
+        queue_handler = LocalQueueHandler(queue)
+
+        for handler in handlers:
+            _logger.removeHandler(handler)
+        _logger.addHandler(queue_handler)
+
+        listener = QueueListener(queue, *handlers, respect_handler_level=True)
+        listener.start()
+        listeners.append(listener)
+        installed.append((_logger, queue_handler, handlers))
+
+    def restore_in_child() -> None:
+        # the listener threads do not survive fork, a child (search/export
+        # worker) exits with os._exit and the inherited queues hold copies
+        # of the parent's records, so the child logs synchronously
+        for _logger, queue_handler, handlers in installed:
+            _logger.removeHandler(queue_handler)
+            for handler in handlers:
+                _logger.addHandler(handler)
+        listeners.clear()
+
+    def stop() -> None:
+        for listener in listeners:
+            listener.stop()
+
+    os.register_at_fork(after_in_child=restore_in_child)
+    atexit.register(stop)
+
+    return listeners
@@ -0,0 +1,145 @@
+import gzip
+import json
+import typing as t
+from pathlib import Path
+
+import numpy as np
+
+
+# popcount of every byte value
+POPCOUNT: np.ndarray = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint16)
+# single valued fields with a bitmap per value
+TERM_FIELDS: tuple[str, ...] = (
+    'gender',
+    'partner_id',
+    'clothing_category_id',
+    'price_tier',
+    'sport',
+    'plus_size',
+    'new',
+    'priority',
+    'figure_type_id',
+    'figure_type_problem_id',
+)
+# multi valued fields, a document matches a value if the list contains it
+MULTI_VALUE_FIELDS: tuple[str, ...] = ('archetypes', 'color_types',)
+RANGE_FIELDS: tuple[str, ...] = ('current_price',)
+
+
+class ShadowIndex:
+    """
+    In-memory columnar copy of the indexed scalar fields of a sample of
+    the catalog, estimates the hit count of a generated filter query
+    with packed bitmap AND / OR and column scans
+    """
+    def __init__(
+        self,
+        documents: t.Iterable[dict[str, t.Any]],
+        total: t.Optional[int] = None
+    ) -> None:
+        values: dict[str, list] = {
+            field: [] for field in TERM_FIELDS + MULTI_VALUE_FIELDS + RANGE_FIELDS
+        }
+        for document in documents:
+            for field, column in values.items():
+                column.append(document.get(field))
+
+        self.size = len(values['gender'])
+        assert self.size, 'shadow index is empty'
+        # sample -> index scale
+        self.scale = (total or self.size) / self.size
+
+        # (field, value) -> packed bitmap
+        self.bitmaps: dict[tuple[str, t.Any], np.ndarray] = {}
+        for field in TERM_FIELDS:
+            column = np.array(values[field])
+            for value in set(values[field]):
+                self.bitmaps[(field, value)] = np.packbits(column == value)
+
+        for field in MULTI_VALUE_FIELDS:
+            members: dict[int, np.ndarray] = {}
+            for i, items in enumerate(values[field]):
+                for item in items or ():
+                    if item not in members:
+                        members[item] = np.zeros(self.size, dtype=bool)
+                    members[item][i] = True
+            for item, mask in members.items():
+                self.bitmaps[(field, item)] = np.packbits(mask)
+
+        self.columns: dict[str, np.ndarray] = {
+            field: np.array(values[field], dtype=np.float32)
+            for field in RANGE_FIELDS
+        }
+        self._empty = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        self._full = np.packbits(np.ones(self.size, dtype=bool))
+
+    @classmethod
+    def from_generator(cls, size: int, total: t.Optional[int] = None) -> 'ShadowIndex':
+        from app.elasticsearch.utils import generate_random_document
+
+        return cls(
+            (
+                generate_random_document(document_id, with_text=False)
+                for document_id in range(1, size + 1)
+            ),
+            total
+        )
+
+    @classmethod
+    def from_export(
+        cls,
+        path: Path,
+        size: t.Optional[int] = None,
+        total: t.Optional[int] = None
+    ) -> 'ShadowIndex':
+        """
+        Reads the `export_index` NDJSON shards, the first `size` documents
+        """
+        def documents() -> t.Iterator[dict[str, t.Any]]:
+            count = 0
+            for file_path in sorted(Path(path).glob('*.ndjson.gz')):
+                with gzip.open(file_path, 'rt', encoding='utf-8') as f:
+                    for line in f:
+                        yield json.loads(line)
+                        count += 1
+                        if size and count >= size:
+                            return
+
+        return cls(documents(), total)
+
+    def estimate(self, query: dict[str, t.Any]) -> t.Optional[int]:
+        """
+        Estimated hits of a `generate_random_search_query` query,
+        None for full text queries
+        """
+        clauses = query['bool']['filter']
+        if isinstance(clauses, dict):
+            return None
+
+        result = self._full
+        for clause in clauses:
+            result = result & self._clause_bitmap(clause)
+
+        return round(int(POPCOUNT[result].sum()) * self.scale)
+
+    def _clause_bitmap(self, clause: dict[str, t.Any]) -> np.ndarray:
+        clause_type, body = next(iter(clause.items()))
+        field, value = next(iter(body.items()))
+
+        if clause_type == 'term':
+            return self.bitmaps.get((field, value), self._empty)
+        if clause_type == 'terms':
+            result = self._empty
+            for item in value:
+                result = result | self.bitmaps.get((field, item), self._empty)
+            return result
+        if clause_type == 'range':
+            column = self.columns[field]
+            mask = np.ones(self.size, dtype=bool)
+            if 'gte' in value:
+                mask &= column >= np.float32(value['gte'])
+            if 'lte' in value:
+                mask &= column <= np.float32(value['lte'])
+            return np.packbits(mask)
+
+        raise ValueError(f'Unsupported clause "{clause_type}"')
@@ -0,0 +1,91 @@
+import json
+import typing as t
+from collections import Counter
+from datetime import datetime
+
+
+class LatencyStats:
+    """
+    Latency histogram with 1 ms buckets (ms -> count)
+    """
+    def __init__(self, histogram: t.Optional[Counter] = None) -> None:
+        self.histogram: Counter = Counter(histogram or {})
+
+    def add(self, ms: int) -> None:
+        self.histogram[ms] += 1
+
+    def merge(self, other: 'LatencyStats') -> None:
+        self.histogram.update(other.histogram)
+
+    def clear(self) -> None:
+        self.histogram.clear()
+
+    @property
+    def count(self) -> int:
+        return sum(self.histogram.values())
+
+    @property
+    def total(self) -> int:
+        return sum(ms * cnt for ms, cnt in self.histogram.items())
+
+    @property
+    def avg(self) -> float:
+        count = self.count
+        return self.total / count if count else 0.0
+
+    @property
+    def max(self) -> int:
+        return max(self.histogram) if self.histogram else 0
+
+    def percentile(self, p: float) -> int:
+        count = self.count
+        if not count:
+            return 0
+
+        threshold = count * p / 100
+        seen = 0
+        for ms in sorted(self.histogram):
+            seen += self.histogram[ms]
+            if seen >= threshold:
+                return ms
+
+        return self.max
+
+
+def get_hits_bucket(hits: int) -> str:
+    """
+    Result-set size bucket (powers of 10): 0, 1-9, 10-99, ...
+    """
+    if hits <= 0:
+        return '0'
+
+    low = 10 ** (len(str(hits)) - 1)
+    return f'{low}-{low * 10 - 1}'
+
+
+def write_run_report(
+    file: t.TextIO,
+    latency: dict[str, LatencyStats],
+    cluster: dict[str, dict[str, t.Any]],
+    **extra: t.Any
+) -> None:
+    """
+    One NDJSON line per reporting window: latency stats and
+    cluster stats sampled during the same window
+    """
+    file.write(json.dumps({
+        'timestamp': datetime.utcnow().isoformat(),
+        'latency': {
+            name: {
+                'count': stats.count,
+                'avg': round(stats.avg, 2),
+                'p50': stats.percentile(50),
+                'p99': stats.percentile(99),
+                'max': stats.max,
+            }
+            for name, stats in latency.items()
+        },
+        'cluster': cluster,
+        **extra,
+    }) + '\n')
+    file.flush()
@@ -0,0 +1,175 @@
+import typing as t
+from math import cos, pi
+from time import monotonic, sleep
+
+import click
+
+from app.logging import logger
+
+
+RATE_PROFILES: tuple[str, ...] = ('constant', 'ramp', 'diurnal',)
+# s, the longest sleep before the scheduled rate is recomputed
+WAIT_STEP: float = 0.1
+
+
+class TokenBucket:
+    """
+    Token bucket throttle (docs/sec or ops/sec) with a rate schedule
+    and AIMD backpressure on slow or rejected requests
+    """
+    def __init__(
+        self,
+        rate: float,
+        burst: t.Optional[float] = None,
+        profile: str = 'constant',
+        ramp_duration: float = 300.0,
+        diurnal_period: float = 3600.0,
+        diurnal_min: float = 0.2,
+        slowdown_factor: float = 2.0,
+        report_interval: float = 10.0,
+        report_file: t.Optional[t.TextIO] = None
+    ) -> None:
+        assert profile in RATE_PROFILES, f'unknown rate profile "{profile}"'
+
+        self.rate = rate
+        self.burst = burst or rate
+        self.profile = profile
+        self.ramp_duration = ramp_duration
+        self.diurnal_period = diurnal_period
+        self.diurnal_min = diurnal_min
+        self.slowdown_factor = slowdown_factor
+        self.report_interval = report_interval
+        self.report_file = report_file
+        # backpressure multiplier, 0.05 - 1
+        self.factor = 1.0
+        # s, the latest bulk request
+        self.last_latency = 0.0
+
+        self._start = self._last = self._window_start = monotonic()
+        # starts empty, so the run is paced from the first request
+        self._tokens = 0.0
+        # request type -> s per document, EMA
+        self._latency_baselines: dict[str, float] = {}
+        self._window_count = 0
+        self._window_target = 0.0
+
+        if self.report_file is not None:
+            self.report_file.write('elapsed,target,actual,factor\n')
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def target_rate(self, elapsed: float) -> float:
+        if self.profile == 'ramp':
+            return self.rate * min(max(elapsed / self.ramp_duration, 0.01), 1.0)
+        if self.profile == 'diurnal':
+            # starts at the trough, peaks in the middle of the period
+            wave = (1 - cos(2 * pi * elapsed / self.diurnal_period)) / 2
+            return self.rate * (self.diurnal_min + (1 - self.diurnal_min) * wave)
+
+        return self.rate
+
+    def acquire(self, count: int = 1) -> None:
+        """
+        Takes `count` tokens, sleeps while the bucket is in debt
+        """
+        if self.enabled:
+            rate = self._refill()
+            self._tokens -= count
+            self._window_target += rate * count
+
+            # the scheduled rate changes during the wait (ramp, diurnal),
+            # so the debt is paid in short steps at the current rate
+            while self._tokens < 0:
+                sleep(min(-self._tokens / rate, WAIT_STEP))
+                rate = self._refill()
+
+        self._window_count += count
+        self._report()
+
+    def feedback(
+        self,
+        latency: float,
+        count: int = 1,
+        key: str = '',
+        rejected: bool = False
+    ) -> None:
+        """
+        Halves the rate when the cluster slows down (per document latency
+        above `slowdown_factor` * baseline of the `key` request type, e.g.
+        create / update / delete) or rejects requests, recovers additively
+        """
+        self.last_latency = latency
+        latency /= max(count, 1)
+        baseline = self._latency_baselines.setdefault(key, latency)
+
+        if rejected or latency > self.slowdown_factor * baseline:
+            # slow samples are kept out of the baseline, a sustained
+            # slowdown must not become the new normal
+            self.factor = max(self.factor / 2, 0.05)
+        else:
+            self.factor = min(self.factor + 0.05, 1.0)
+            self._latency_baselines[key] = 0.95 * baseline + 0.05 * latency
+
+    def _refill(self) -> float:
+        """
+        Adds the tokens accrued since the last call, returns the current rate
+        """
+        now = monotonic()
+        rate = self.target_rate(now - self._start) * self.factor
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * rate)
+        self._last = now
+
+        return rate
+
+    def _report(self) -> None:
+        now = monotonic()
+        window = now - self._window_start
+        if window < self.report_interval:
+            return
+
+        actual = self._window_count / window
+        target = (
+            self._window_target / self._window_count
+            if self.enabled and self._window_count else 0.0
+        )
+        elapsed = now - self._start
+
+        logger.info(
+            f'rate target: {target:>9.1f}/s, actual: {actual:>9.1f}/s, '
+            f'backpressure factor: {self.factor:.2f}'
+        )
+        if self.report_file is not None:
+            self.report_file.write(
+                f'{elapsed:.1f},{target:.1f},{actual:.1f},{self.factor:.2f}\n'
+            )
+            self.report_file.flush()
+
+        self._window_start = now
+        self._window_count = 0
+        self._window_target = 0.0
+
+
+def throttle_options(func: t.Callable) -> t.Callable:
+    options = (
+        click.option(
+            '--rate',
+            type=float,
+            default=0.0,
+            help='target docs/sec (ops/sec), 0 - unlimited'
+        ),
+        click.option('--burst', type=float, default=None),
+        click.option(
+            '--rate_profile',
+            type=click.Choice(RATE_PROFILES),
+            default='constant'
+        ),
+        click.option('--ramp_duration', type=float, default=300.0, help='s'),
+        click.option('--diurnal_period', type=float, default=3600.0, help='s'),
+    )
+
+    for option in reversed(options):
+        func = option(func)
+
+    return func
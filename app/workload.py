@@ -0,0 +1,203 @@
+import typing as t
+from bisect import bisect_left
+from pathlib import Path
+from random import randint, random, randrange
+
+import yaml
+
+
+Sampler = t.Callable[[], t.Any]
+
+
+class AliasTable:
+    """
+    O(1) sampling from a discrete distribution (Vose's alias method)
+    """
+    def __init__(self, values: t.Sequence[t.Any], weights: t.Sequence[float]) -> None:
+        assert len(values) == len(weights) and values, 'empty distribution'
+
+        n = len(values)
+        total = sum(weights)
+        scaled = [weight * n / total for weight in weights]
+
+        self.values = list(values)
+        self.prob: list[float] = [1.0] * n
+        self.alias: list[int] = list(range(n))
+
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+
+    def __call__(self) -> t.Any:
+        i = randrange(len(self.values))
+        return self.values[i if random() < self.prob[i] else self.alias[i]]
+
+
+def compile_sampler(spec: dict[str, t.Any]) -> Sampler:
+    """
+    uniform:      {type: uniform, min: 1, max: 120, divisor: 1}
+    categorical:  {type: categorical, values: {FEMALE: 19, MALE: 11}}
+    zipf:         {type: zipf, min: 1, max: 120, s: 1.1}
+    bernoulli:    {type: bernoulli, p: 0.05}
+    range_list:   {type: range_list, start: <spec>, length: <spec>}
+    interval:     {type: interval, min: 100, min_upper: 125, max: 1000, divisor: 10}
+                  (lower, upper), upper in [min_upper, max], lower in [min, upper)
+    constant:     {type: constant, value: ...}
+    """
+    kind = spec['type']
+
+    if kind == 'uniform':
+        low, high = spec['min'], spec['max']
+        divisor = spec.get('divisor')
+        if divisor:
+            return lambda: randint(low, high) / divisor
+        return lambda: randint(low, high)
+    if kind == 'categorical':
+        values = spec['values']
+        return AliasTable(list(values), list(values.values()))
+    if kind == 'zipf':
+        # rank 1 (the most frequent value) is `min`
+        values = list(range(spec['min'], spec['max'] + 1))
+        weights = [1 / rank ** spec['s'] for rank in range(1, len(values) + 1)]
+        return AliasTable(values, weights)
+    if kind == 'bernoulli':
+        p = spec['p']
+        return lambda: random() < p
+    if kind == 'range_list':
+        start, length = compile_sampler(spec['start']), compile_sampler(spec['length'])
+
+        def range_list() -> list[int]:
+            _start = start()
+            return [i for i in range(_start, _start + length())]
+
+        return range_list
+    if kind == 'interval':
+        low, high = spec['min'], spec['max']
+        min_upper = spec.get('min_upper', low + 1)
+        divisor = spec.get('divisor', 1)
+
+        def interval() -> tuple[float, float]:
+            upper = randint(min_upper, high)
+            return randint(low, upper - 1) / divisor, upper / divisor
+
+        return interval
+    if kind == 'constant':
+        value = spec['value']
+        return lambda: value
+
+    raise ValueError(f'Unknown sampler type "{kind}"')
+
+
+def get_upper_bound(spec: dict[str, t.Any]) -> float:
+    """
+    The largest value of a uniform / zipf / constant sampler
+    """
+    kind = spec['type']
+
+    if kind in ('uniform', 'zipf',):
+        return spec['max'] / (spec.get('divisor') or 1)
+    if kind == 'constant':
+        return spec['value']
+
+    raise ValueError(f'Sampler type "{kind}" has no upper bound')
+
+
+class Workload:
+    """
+    Compiled workload profile (see workloads/default.yml)
+    """
+    def __init__(self, profile: dict[str, t.Any], name: str = '') -> None:
+        self.name = name
+        self.documents: dict[str, Sampler] = {}
+        # price tier -> current price sampler
+        self.prices: dict[int, Sampler] = {}
+        # upper current price of the tiers 0 .. n - 2, see `get_price_tier`
+        self.price_tier_bounds: list[float] = []
+
+        for field, spec in profile['documents'].items():
+            if field == 'current_price':
+                tiers = {
+                    int(price_tier): tier_spec
+                    for price_tier, tier_spec in spec['by_price_tier'].items()
+                }
+                assert sorted(tiers) == list(range(len(tiers))), (
+                    'price tiers must be 0 .. n - 1'
+                )
+                self.prices = {
+                    price_tier: compile_sampler(tier_spec)
+                    for price_tier, tier_spec in tiers.items()
+                }
+                self.price_tier_bounds = [
+                    get_upper_bound(tiers[price_tier])
+                    for price_tier in range(len(tiers) - 1)
+                ]
+                assert self.price_tier_bounds == sorted(self.price_tier_bounds), (
+                    'price tiers must be ordered by current price'
+                )
+            else:
+                self.documents[field] = compile_sampler(spec)
+
+        queries = profile['queries']
+        self.sort_probability: float = queries['sort_probability']
+        self.sort_field: Sampler = compile_sampler(queries['sort_field'])
+        self.text_probability: float = queries['text_probability']
+        self.filter_fields: list[str] = list(queries['filter_fields'])
+        self.filter_weights: list[float] = list(queries['filter_fields'].values())
+        values = dict(queries.get('values') or {})
+        # price tier -> current price (gte, lte) range sampler
+        self.price_ranges: dict[int, Sampler] = {
+            int(price_tier): compile_sampler(tier_spec)
+            for price_tier, tier_spec in (
+                values.pop('current_price', {}).get('by_price_tier') or {}
+            ).items()
+        }
+        # query values, fall back to the document samplers
+        self.queries: dict[str, Sampler] = {
+            field: compile_sampler(spec)
+            for field, spec in values.items()
+        }
+
+    def sample_filter_fields(self, count: int) -> list[str]:
+        """
+        `count` distinct fields, weighted sampling without replacement
+        (Efraimidis-Spirakis keys)
+        """
+        if count <= 0:
+            return []
+
+        keys = sorted(
+            (random() ** (1 / weight), field)
+            for field, weight in zip(self.filter_fields, self.filter_weights)
+            if weight > 0
+        )
+
+        return [field for _, field in keys[-count:]][::-1]
+
+    def query_value(self, field: str) -> t.Any:
+        return self.queries.get(field, self.documents[field])()
+
+    def price_range(self, price_tier: int) -> tuple[float, float]:
+        """
+        Falls back to two current prices of the tier
+        """
+        if price_tier in self.price_ranges:
+            return self.price_ranges[price_tier]()
+
+        low, high = sorted((self.prices[price_tier](), self.prices[price_tier]()))
+        return low, high
+
+    def get_price_tier(self, price: float) -> int:
+        return bisect_left(self.price_tier_bounds, price)
+
+
+def load_workload(path: Path) -> Workload:
+    with open(path, 'r') as f:
+        profile: dict = yaml.load(f, Loader=yaml.FullLoader)
+
+    return Workload(profile, name=Path(path).stem)
@@ -1,11 +1,15 @@
 from logging.config import dictConfig
 
 from app.cli import cli
-from app.config import LOGGING_CONFIG
+from app.config import LOGGING_ASYNC, LOGGING_CONFIG
+from app.logging import start_queue_listeners
 
 
 dictConfig(LOGGING_CONFIG)
 
+if LOGGING_ASYNC:
+    start_queue_listeners(('catalog', 'elasticsearch',))
+
 
 if __name__ == '__main__':
     cli()